@@ -5,3 +5,7 @@ class BlockchainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blockchain'
 
+    def ready(self):
+        from wanjiku_ai.caching import watch_models
+        from .models import DocumentTemplate
+        watch_models(DocumentTemplate)
@@ -6,6 +6,7 @@ from django.http import FileResponse
 from .models import DocumentVerification, BlockchainTransaction, DocumentTemplate
 from .services import DocumentVerificationService
 from .serializers import DocumentVerificationSerializer, BlockchainTransactionSerializer, DocumentTemplateSerializer
+from wanjiku_ai.caching import CachedReadOnlyMixin
 
 
 class DocumentVerificationViewSet(viewsets.ModelViewSet):
@@ -156,11 +157,12 @@ class BlockchainTransactionViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
 
-class DocumentTemplateViewSet(viewsets.ReadOnlyModelViewSet):
+class DocumentTemplateViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for document templates"""
     queryset = DocumentTemplate.objects.filter(is_active=True)
     serializer_class = DocumentTemplateSerializer
     permission_classes = [IsAuthenticated]
+    cached_actions = ('list', 'retrieve', 'by_type')
     
     @action(detail=False, methods=['get'])
     def by_type(self, request):
@@ -1,5 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import ChatSession, ChatMessage, SwahiliIntent
+from .cache import get_response_cache
 
 
 @admin.register(ChatSession)
@@ -21,4 +22,21 @@ class SwahiliIntentAdmin(admin.ModelAdmin):
     list_display = ['intent_name_swahili', 'service_category', 'is_active']
     list_filter = ['service_category', 'is_active']
     search_fields = ['intent_name', 'intent_name_swahili']
+    actions = ['clear_response_cache']
+    
+    @admin.action(description='Clear cached LLM responses')
+    def clear_response_cache(self, request, queryset):
+        """Invalidate the LLM response cache"""
+        response_cache = get_response_cache()
+        if response_cache is None:
+            self.message_user(request, 'LLM response cache is disabled', messages.WARNING)
+            return
+        
+        stats = response_cache.stats()
+        response_cache.clear()
+        self.message_user(
+            request,
+            f"LLM response cache cleared (hits: {stats['hits']}, misses: {stats['misses']})",
+            messages.SUCCESS
+        )
 
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from .text import message_key
+
+
+class ResponseCache:
+    """Base class for caches of LLM responses keyed on normalized messages"""
+
+    def __init__(self, ttl=3600, max_entries=1000, **options):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def make_key(self, message):
+        """Build the cache key for a message"""
+        return message_key(message)
+
+    def get(self, message):
+        """Return the cached response for message, or None"""
+        response = self._get(self.make_key(message))
+        with self._stats_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, message, response):
+        """Cache the response for message"""
+        if response:
+            self._set(self.make_key(message), response)
+
+    def clear(self):
+        """Invalidate every cached response"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.__class__.__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+            }
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, response):
+        raise NotImplementedError
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU response cache with per-entry TTL"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _set(self, key, response):
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['entries'] = len(self._entries)
+        return stats
+
+
+class DjangoResponseCache(ResponseCache):
+    """Response cache stored in a Django cache alias, shared between workers"""
+
+    def __init__(self, alias='default', key_prefix='chat:llm', **options):
+        super().__init__(**options)
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation(self):
+        # Clearing bumps the generation instead of deleting keys, so entries
+        # from before an invalidation are simply never read again and age out.
+        generation_key = f'{self.key_prefix}:generation'
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            self.cache.add(generation_key, 1, None)
+            generation = self.cache.get(generation_key, 1)
+        return generation
+
+    def _cache_key(self, key):
+        return f'{self.key_prefix}:{self._generation()}:{key}'
+
+    def _get(self, key):
+        return self.cache.get(self._cache_key(key))
+
+    def _set(self, key, response):
+        # Size bounds come from the MAX_ENTRIES option of the cache alias
+        self.cache.set(self._cache_key(key), response, self.ttl)
+
+    def clear(self):
+        generation_key = f'{self.key_prefix}:generation'
+        try:
+            self.cache.incr(generation_key)
+        except ValueError:
+            self.cache.set(generation_key, 2, None)
+
+
+BACKENDS = {
+    'memory': 'chat.cache.MemoryResponseCache',
+    'django': 'chat.cache.DjangoResponseCache',
+}
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the process-wide LLM response cache configured in settings"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                options = dict(getattr(settings, 'LLM_RESPONSE_CACHE', {}))
+                if not options.pop('ENABLED', True):
+                    return None
+                backend = options.pop('BACKEND', 'django')
+                cache_class = import_string(BACKENDS.get(backend, backend))
+                _response_cache = cache_class(**{key.lower(): value for key, value in options.items()})
+    return _response_cache
@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from .models import ChatSession, ChatMessage
+from .persistence import message_buffer
+from .llm import create_chat_completion, request_timeout
+from .resilience import Deadline, llm_breaker
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are Wanjiku, a helpful Kenyan government assistant. Respond in Swahili."
+SUMMARY_PROMPT = (
+    "Fupisha mazungumzo haya kati ya raia na Wanjiku kwa Kiswahili, kwa sentensi chache. "
+    "Hifadhi majina, huduma, tarehe na maombi muhimu."
+)
+ROLES = {'user': 'user', 'assistant': 'assistant', 'system': 'system'}
+SUMMARY_LOCK_TIMEOUT = 120
+
+
+def _context_settings():
+    options = {
+        'TOKEN_BUDGET': 1200,
+        'MAX_HISTORY': 20,
+        'SUMMARY_BATCH': 6,
+        'SUMMARY_MAX_TOKENS': 150,
+        'SUMMARY_MAX_MESSAGES': 40,
+        'SUMMARY_TIMEOUT': 20.0,
+    }
+    options.update(getattr(settings, 'CHAT_CONTEXT', {}))
+    return options
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(text) // 4 + 4
+
+
+class ConversationContext:
+    """Messages to send to the LLM for one turn"""
+
+    def __init__(self, messages, standalone):
+        self.messages = messages
+        # True when the turn has no earlier conversation to depend on
+        self.standalone = standalone
+
+
+class ConversationContextBuilder:
+    """Fit recent chat turns and a rolling summary into a token budget"""
+
+    def __init__(self, **options):
+        self.options = _context_settings()
+        self.options.update({key.upper(): value for key, value in options.items()})
+
+    def build(self, session, message):
+        """Build the LLM messages for a new user message in session"""
+        # Sessions are cached per process, so another worker may have
+        # summarized this one since
+        summary = ChatSession.objects.filter(pk=session.pk).values_list('summary', 'summary_until').first()
+        if summary is not None:
+            session.summary, session.summary_until = summary
+        history = self._unsummarized_messages(session)
+        # The current message has already been queued for saving
+        if history and history[-1].message_type == 'user' and history[-1].content == message:
+            history = history[:-1]
+
+        budget = self.options['TOKEN_BUDGET'] - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(message)
+        if session.summary:
+            budget -= estimate_tokens(session.summary)
+
+        # Keep the newest turns that fit; everything older is left for the summary
+        kept = []
+        for chat_message in reversed(history[-self.options['MAX_HISTORY']:]):
+            cost = estimate_tokens(chat_message.content)
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append(chat_message)
+        kept.reverse()
+        overflow = history[:len(history) - len(kept)]
+
+        if len(overflow) >= self.options['SUMMARY_BATCH']:
+            self._summarize_later(session, overflow[:self.options['SUMMARY_MAX_MESSAGES']])
+
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        if session.summary:
+            messages.append({'role': 'system', 'content': f"Muhtasari wa mazungumzo ya awali: {session.summary}"})
+        for chat_message in kept:
+            messages.append({'role': ROLES.get(chat_message.message_type, 'user'), 'content': chat_message.content})
+        messages.append({'role': 'user', 'content': message})
+
+        return ConversationContext(messages, standalone=not session.summary and not kept)
+
+    def _unsummarized_messages(self, session):
+        """Every message of the session after its summary, oldest first
+
+        Saved rows are read in pages of MAX_HISTORY, so turns that fall out
+        of the recent window are still seen and summarized.
+        """
+        queryset = ChatMessage.objects.filter(session=session)
+        if session.summary_until:
+            queryset = queryset.filter(timestamp__gt=session.summary_until)
+        saved = list(queryset.order_by('timestamp').iterator(chunk_size=self.options['MAX_HISTORY']))
+
+        # Messages still in the write-behind buffer are part of the history too
+        pending = message_buffer.pending_for(session)
+        if session.summary_until:
+            pending = [chat_message for chat_message in pending if chat_message.timestamp > session.summary_until]
+        return sorted(saved + pending, key=lambda chat_message: chat_message.timestamp)
+
+    def _summarize_later(self, session, overflow):
+        """Fold overflowing turns into the summary without delaying this turn"""
+        lock_key = f'chat:summary:{session.pk}'
+        if not cache.add(lock_key, 1, SUMMARY_LOCK_TIMEOUT):
+            # Already being summarized
+            return
+        try:
+            _summary_executor().submit(
+                self._update_summary, session.pk, session.session_id, session.summary,
+                session.summary_until, overflow, lock_key
+            )
+        except RuntimeError:
+            cache.delete(lock_key)
+            raise
+
+    def _update_summary(self, session_pk, session_id, previous_summary, previous_until, overflow, lock_key):
+        """Summarize overflow and save it unless another worker got there first"""
+        transcript = '\n'.join(
+            f"{'Raia' if chat_message.message_type == 'user' else 'Wanjiku'}: {chat_message.content}"
+            for chat_message in overflow
+        )
+        if previous_summary:
+            transcript = f"Muhtasari wa awali: {previous_summary}\n\n{transcript}"
+
+        def summarize(timeout):
+            response = create_chat_completion(
+                timeout=request_timeout(timeout),
+                acquire_timeout=timeout,
+                model="gpt-3.5-turbo",
+                messages=[
+                    {'role': 'system', 'content': SUMMARY_PROMPT},
+                    {'role': 'user', 'content': transcript}
+                ],
+                max_tokens=self.options['SUMMARY_MAX_TOKENS'],
+                temperature=0.3
+            )
+            return response.choices[0].message.content
+
+        try:
+            summary = llm_breaker.call(summarize, Deadline(self.options['SUMMARY_TIMEOUT']))
+            ChatSession.objects.filter(pk=session_pk, summary_until=previous_until).update(
+                summary=summary,
+                summary_until=overflow[-1].timestamp
+            )
+        except Exception:
+            # Without a new summary the older turns are simply left out
+            logger.exception('Could not summarize session %s', session_id)
+        finally:
+            cache.delete(lock_key)
+            close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _summary_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+    return _executor
+
+
+def _reset_executor():
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executor)
@@ -0,0 +1,192 @@
+import json
+import re
+import threading
+from pathlib import Path
+from .text import strip_accents
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.json'
+
+_THOUSANDS = re.compile(r'(?<=\d),(?=\d{3}\b)')
+_TOKEN = re.compile(r'\d+(?:[/.-]\d+)*|[^\W\d_]+', re.UNICODE)
+_NUMERIC_DATE = re.compile(r'^\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?$')
+_TERMINAL = object()
+
+
+def entity_tokens(text):
+    """Tokenize text for entity extraction, keeping numbers and numeric dates whole"""
+    text = strip_accents(text.lower()).replace("'", '')
+    return _TOKEN.findall(_THOUSANDS.sub('', text))
+
+
+class EntityExtractor:
+    """Precompiled gazetteer matcher for services, places, dates and numbers"""
+
+    def __init__(self, gazetteer):
+        self._trie = {}
+        self.numbers = gazetteer['numbers']
+        self.multipliers = gazetteer['multipliers']
+        self.months = gazetteer['months']
+
+        for phrase, service in gazetteer['services'].items():
+            self._add(phrase, 'services', service)
+        for place in gazetteer['counties'] + gazetteer['towns']:
+            self._add(place, 'locations', place)
+        for phrase, value in gazetteer['dates'].items():
+            self._add(phrase, 'dates', value)
+        for month in self.months:
+            self._add(month, 'dates', month)
+
+    @classmethod
+    def from_file(cls, path=GAZETTEER_PATH):
+        with open(path, encoding='utf-8') as gazetteer_file:
+            return cls(json.load(gazetteer_file))
+
+    def _add(self, phrase, category, value):
+        node = self._trie
+        for token in entity_tokens(phrase):
+            node = node.setdefault(token, {})
+        node[_TERMINAL] = (category, value)
+
+    def _longest_phrase(self, tokens, start):
+        node = self._trie
+        match = None
+        for position in range(start, len(tokens)):
+            node = node.get(tokens[position])
+            if node is None:
+                break
+            if _TERMINAL in node:
+                match = (node[_TERMINAL], position + 1)
+        return match
+
+    def _below_hundred(self, tokens, position):
+        # "ishirini na tano" is 25; a unit after "na" only joins a tens word
+        value = self.numbers[tokens[position]]
+        position += 1
+        if (10 <= value < 100 and value % 10 == 0 and position + 1 < len(tokens)
+                and tokens[position] == 'na' and self.numbers.get(tokens[position + 1], 10) < 10):
+            value += self.numbers[tokens[position + 1]]
+            position += 2
+        return value, position
+
+    def _count(self, tokens, position, multiplier):
+        # The count after a multiplier is itself a number below it:
+        # "elfu ishirini na tano" is 25 thousand, "milioni mia tatu" 300 million
+        value = 0
+        hundreds = self.multipliers.get('mia')
+        if hundreds and multiplier > hundreds and position < len(tokens) and tokens[position] == 'mia':
+            position += 1
+            count = 1
+            if position < len(tokens) and self.numbers.get(tokens[position], 10) < 10:
+                count = self.numbers[tokens[position]]
+                position += 1
+            value = hundreds * count
+            if (position + 1 < len(tokens) and tokens[position] == 'na'
+                    and tokens[position + 1] in self.numbers):
+                position += 1
+        if position < len(tokens) and tokens[position] in self.numbers:
+            below, position = self._below_hundred(tokens, position)
+            value += below
+        return (value, position) if value else (1, position)
+
+    def _component(self, tokens, position):
+        token = tokens[position] if position < len(tokens) else None
+        if token in self.numbers:
+            return self._below_hundred(tokens, position)
+        if token in self.multipliers:
+            count, position = self._count(tokens, position + 1, self.multipliers[token])
+            return self.multipliers[token] * count, position
+        return None
+
+    def _number_words(self, tokens, start):
+        # Swahili puts multipliers first: "elfu mbili" is 2000 and
+        # "mia tatu na hamsini" is 350. A part only joins after a larger
+        # one of at least ten, so "mbili na tatu" stays two numbers.
+        component = self._component(tokens, start)
+        if component is None:
+            return None
+        total, position = component
+        last = total
+        while position < len(tokens):
+            following = position + 1 if tokens[position] == 'na' else position
+            component = self._component(tokens, following)
+            if component is None or last < 10 or component[0] >= last:
+                break
+            last, position = component
+            total += last
+        return total, position
+
+    def extract(self, text):
+        """Extract entities from Swahili text in one pass over its tokens"""
+        entities = {
+            'services': [],
+            'locations': [],
+            'dates': [],
+            'numbers': []
+        }
+        tokens = entity_tokens(text)
+        position = 0
+
+        while position < len(tokens):
+            token = tokens[position]
+            following = tokens[position + 1] if position + 1 < len(tokens) else None
+
+            phrase = self._longest_phrase(tokens, position)
+            if phrase:
+                (category, value), position = phrase
+                entities[category].append(value)
+                continue
+
+            if token == 'tarehe' and following and following.isdigit():
+                # "tarehe 5" or "tarehe 5 mei"
+                end = position + 2
+                if end < len(tokens) and tokens[end] in self.months:
+                    end += 1
+                entities['dates'].append(' '.join(tokens[position:end]))
+                position = end
+                continue
+
+            if token[0].isdigit():
+                if _NUMERIC_DATE.match(token):
+                    entities['dates'].append(token)
+                elif token.isdigit() and following in self.months:
+                    entities['dates'].append(f'{token} {following}')
+                    position += 1
+                elif token.isdigit():
+                    entities['numbers'].append(int(token))
+                position += 1
+                continue
+
+            number = self._number_words(tokens, position)
+            if number:
+                value, position = number
+                entities['numbers'].append(value)
+                continue
+
+            position += 1
+
+        for category in ('services', 'locations', 'dates'):
+            entities[category] = list(dict.fromkeys(entities[category]))
+        return entities
+
+    def extract_many(self, texts):
+        """Extract entities from many texts"""
+        return [self.extract(text) for text in texts]
+
+    def extract_from_queryset(self, queryset, field='content', chunk_size=2000):
+        """Yield (pk, entities) for every row of a queryset, e.g. a message backlog"""
+        for pk, text in queryset.values_list('pk', field).iterator(chunk_size=chunk_size):
+            yield pk, self.extract(text or '')
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_entity_extractor():
+    """Get the process-wide entity extractor, loading gazetteers on first use"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = EntityExtractor.from_file()
+    return _extractor
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from .models import SwahiliIntent
+
+VERSION_CACHE_KEY = 'chat:intents:version'
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton for matching many keywords in one pass"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+    def add(self, keyword, value):
+        """Add a keyword and the value reported when it matches"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(value)
+
+    def build(self):
+        """Compute failure links once all keywords have been added"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield the value of every keyword found in text"""
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            yield from self._output[state]
+
+
+class IntentMatcher:
+    """Compiled keyword matcher over all active Swahili intents"""
+
+    def __init__(self, intents):
+        self._intents = {intent.pk: intent for intent in intents}
+        self._compile()
+
+    def _compile(self):
+        # Rank intents the same way SwahiliIntent.Meta.ordering does so the
+        # first match is the same intent the old queryset loop returned.
+        ranked = sorted(self._intents.values(), key=lambda intent: (intent.intent_name, intent.pk))
+        self._ranked = ranked
+        self._automaton = KeywordAutomaton()
+        for rank, intent in enumerate(ranked):
+            for keyword in intent.keywords or []:
+                keyword = str(keyword).lower()
+                if keyword:
+                    self._automaton.add(keyword, rank)
+        self._automaton.build()
+
+    def match(self, message):
+        """Return the best matching intent for message, or None"""
+        best = None
+        for rank in self._automaton.iter_matches(message.lower()):
+            if best is None or rank < best:
+                best = rank
+                if best == 0:
+                    break
+        return self._ranked[best] if best is not None else None
+
+    @property
+    def intents(self):
+        """Active intents in match priority order"""
+        return list(self._ranked)
+
+    def with_intent(self, intent):
+        """Return a new matcher with intent added, replaced or removed"""
+        intents = dict(self._intents)
+        intents.pop(intent.pk, None)
+        if intent.is_active:
+            intents[intent.pk] = intent
+        return IntentMatcher(intents.values())
+
+    def without_intent(self, intent_id):
+        """Return a new matcher with the given intent removed"""
+        intents = dict(self._intents)
+        intents.pop(intent_id, None)
+        return IntentMatcher(intents.values())
+
+    def __len__(self):
+        return len(self._intents)
+
+
+_matcher = None
+_matcher_version = None
+_matcher_checked_at = 0.0
+_matcher_lock = threading.Lock()
+
+
+def _shared_version():
+    return cache.get(VERSION_CACHE_KEY, 0)
+
+
+def get_intent_matcher():
+    """Get the process-wide intent matcher, loading it on first use"""
+    global _matcher, _matcher_version, _matcher_checked_at
+    matcher = _matcher
+    now = time.monotonic()
+    refresh_seconds = getattr(settings, 'INTENT_MATCHER_REFRESH_SECONDS', 30)
+    if matcher is not None and now - _matcher_checked_at < refresh_seconds:
+        return matcher
+
+    # Other workers bump the shared version when they change intents, so
+    # the local copy is reloaded at most once per refresh interval.
+    with _matcher_lock:
+        version = _shared_version()
+        if _matcher is None or version != _matcher_version:
+            _matcher = IntentMatcher(SwahiliIntent.objects.filter(is_active=True))
+            _matcher_version = version
+        _matcher_checked_at = now
+        return _matcher
+
+
+def detect_intent(message):
+    """Detect the intent of a message using the shared matcher"""
+    return get_intent_matcher().match(message)
+
+
+def _bump_shared_version():
+    global _matcher_version
+    try:
+        version = cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        version = 1
+        cache.set(VERSION_CACHE_KEY, version, None)
+    if _matcher_version is not None:
+        _matcher_version = version
+
+
+def update_intent(intent):
+    """Apply a saved intent to the shared matcher without reloading from the DB"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is not None:
+            _matcher = _matcher.with_intent(intent)
+        _bump_shared_version()
+
+
+def remove_intent(intent_id):
+    """Drop a deleted intent from the shared matcher"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is not None:
+            _matcher = _matcher.without_intent(intent_id)
+        _bump_shared_version()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+import httpx
+import openai
+from django.conf import settings
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within the acquire timeout"""
+
+
+def _llm_settings():
+    options = {
+        'BASE_URL': '',
+        'TIMEOUT': 20.0,
+        'CONNECT_TIMEOUT': 5.0,
+        'MAX_RETRIES': 1,
+        'MAX_CONNECTIONS': 20,
+        'MAX_KEEPALIVE_CONNECTIONS': 10,
+        'KEEPALIVE_EXPIRY': 60.0,
+        'MAX_CONCURRENCY': 16,
+        'ACQUIRE_TIMEOUT': 5.0,
+    }
+    options.update(getattr(settings, 'LLM_CLIENT', {}))
+    return options
+
+
+class LLMClientRegistry:
+    """Lazily created OpenAI clients shared by every service in a process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._client = None
+        self._semaphore = None
+        # Async clients and semaphores are bound to the event loop using them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _check_pid(self):
+        # Connection pools must never be shared across a fork, so a child
+        # process starts over with its own client.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _client_options(self, options):
+        client_options = {
+            'api_key': settings.OPENAI_API_KEY,
+            'max_retries': options['MAX_RETRIES'],
+            'timeout': httpx.Timeout(options['TIMEOUT'], connect=options['CONNECT_TIMEOUT']),
+        }
+        if options['BASE_URL']:
+            client_options['base_url'] = options['BASE_URL']
+        return client_options
+
+    def _limits(self, options):
+        return httpx.Limits(
+            max_connections=options['MAX_CONNECTIONS'],
+            max_keepalive_connections=options['MAX_KEEPALIVE_CONNECTIONS'],
+            keepalive_expiry=options['KEEPALIVE_EXPIRY'],
+        )
+
+    def get_client(self):
+        """Get the pooled synchronous OpenAI client"""
+        with self._lock:
+            self._check_pid()
+            if self._client is None:
+                options = _llm_settings()
+                self._client = openai.OpenAI(
+                    http_client=httpx.Client(limits=self._limits(options)),
+                    **self._client_options(options)
+                )
+            return self._client
+
+    def get_semaphore(self):
+        """Get the semaphore bounding concurrent LLM calls in this process"""
+        with self._lock:
+            self._check_pid()
+            if self._semaphore is None:
+                self._semaphore = threading.BoundedSemaphore(_llm_settings()['MAX_CONCURRENCY'])
+            return self._semaphore
+
+    def get_async_client(self):
+        """Get the pooled async OpenAI client and semaphore for the running loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._check_pid()
+            entry = self._async_clients.get(loop)
+            if entry is None:
+                options = _llm_settings()
+                client = openai.AsyncOpenAI(
+                    http_client=httpx.AsyncClient(limits=self._limits(options)),
+                    **self._client_options(options)
+                )
+                entry = (client, asyncio.Semaphore(options['MAX_CONCURRENCY']))
+                self._async_clients[loop] = entry
+            return entry
+
+    def reset(self):
+        """Drop all clients, e.g. after settings change"""
+        with self._lock:
+            self._reset()
+
+    def after_fork(self):
+        """Start a forked child with a fresh lock and no inherited clients"""
+        self._lock = threading.Lock()
+        self._reset()
+
+
+registry = LLMClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.after_fork)
+
+
+def get_openai_client():
+    """Get the process-wide pooled OpenAI client"""
+    return registry.get_client()
+
+
+@contextmanager
+def llm_slot(acquire_timeout=None):
+    """Hold one of the process-wide LLM concurrency slots"""
+    if acquire_timeout is None:
+        acquire_timeout = _llm_settings()['ACQUIRE_TIMEOUT']
+    semaphore = registry.get_semaphore()
+    if not semaphore.acquire(timeout=acquire_timeout):
+        raise LLMBusyError('All LLM slots are busy')
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def get_async_openai_client():
+    """Get the pooled async OpenAI client for the running event loop"""
+    return registry.get_async_client()[0]
+
+
+@asynccontextmanager
+async def async_llm_slot(acquire_timeout=None):
+    """Hold one of the LLM concurrency slots of the running event loop"""
+    if acquire_timeout is None:
+        acquire_timeout = _llm_settings()['ACQUIRE_TIMEOUT']
+    semaphore = registry.get_async_client()[1]
+    try:
+        await asyncio.wait_for(semaphore.acquire(), acquire_timeout)
+    except asyncio.TimeoutError:
+        raise LLMBusyError('All LLM slots are busy')
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def request_timeout(budget):
+    """Per-attempt timeout that keeps a request and its retries within budget seconds"""
+    options = _llm_settings()
+    return min(options['TIMEOUT'], budget / (options['MAX_RETRIES'] + 1))
+
+
+def create_chat_completion(timeout=None, acquire_timeout=None, **kwargs):
+    """Create a chat completion through the shared client and concurrency limit"""
+    if timeout is None:
+        timeout = _llm_settings()['TIMEOUT']
+    with llm_slot(acquire_timeout):
+        return get_openai_client().chat.completions.create(timeout=timeout, **kwargs)
+
+
+async def acreate_chat_completion(timeout=None, acquire_timeout=None, **kwargs):
+    """Async version of create_chat_completion using the shared async client"""
+    if timeout is None:
+        timeout = _llm_settings()['TIMEOUT']
+    async with async_llm_slot(acquire_timeout):
+        return await get_async_openai_client().chat.completions.create(timeout=timeout, **kwargs)
+
+
+async def astream_chat_completion(timeout=None, acquire_timeout=None, **kwargs):
+    """Yield content deltas of a streamed chat completion as they arrive"""
+    if timeout is None:
+        timeout = _llm_settings()['TIMEOUT']
+    async with async_llm_slot(acquire_timeout):
+        stream = await get_async_openai_client().chat.completions.create(
+            stream=True, timeout=timeout, **kwargs
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
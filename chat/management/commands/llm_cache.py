@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from chat.cache import MemoryResponseCache, get_response_cache
+from chat.singleflight import llm_flight
+
+
+class Command(BaseCommand):
+    help = 'Show statistics for the LLM response cache and request coalescing, or clear the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Invalidate all cached responses')
+
+    def handle(self, *args, **options):
+        for key, value in llm_flight.stats().items():
+            self.stdout.write(f'coalescing {key}: {value}')
+
+        response_cache = get_response_cache()
+        if response_cache is None:
+            self.stdout.write(self.style.WARNING('LLM response cache is disabled'))
+            return
+
+        if options['clear']:
+            response_cache.clear()
+            if isinstance(response_cache, MemoryResponseCache):
+                self.stdout.write(self.style.WARNING(
+                    "The 'memory' backend is per process; running workers keep their entries"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('LLM response cache cleared'))
+
+        for key, value in response_cache.stats().items():
+            self.stdout.write(f'{key}: {value}')
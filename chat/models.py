@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class ChatSession(models.Model):
@@ -7,6 +8,8 @@ class ChatSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_id = models.CharField(max_length=100, unique=True)
     language = models.CharField(max_length=10, default='sw')  # 'sw' for Swahili, 'en' for English
+    summary = models.TextField(blank=True)  # Rolling summary of older turns
+    summary_until = models.DateTimeField(null=True, blank=True)  # Last message folded into the summary
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -29,11 +32,15 @@ class ChatMessage(models.Model):
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPES)
     content = models.TextField()
     content_swahili = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered messages are stamped when queued, not when flushed
+    timestamp = models.DateTimeField(default=timezone.now)
     is_processed = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='chat_message_session_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.message_type}: {self.content[:50]}"
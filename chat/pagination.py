@@ -0,0 +1,27 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from .models import ChatMessage
+
+
+class ChatMessageCursorPagination(CursorPagination):
+    """Keyset pagination of chat messages on (timestamp, id)"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('timestamp', 'id')
+
+
+def messages_since(queryset, since):
+    """Limit messages to those after the message with id `since`"""
+    if not since:
+        return queryset
+    try:
+        since = int(since)
+    except (TypeError, ValueError):
+        raise ValidationError({'since': 'Must be a message id'})
+
+    timestamp = ChatMessage.objects.filter(pk=since).values_list('timestamp', flat=True).first()
+    if timestamp is None:
+        return queryset
+    return queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=since))
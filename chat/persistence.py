@@ -0,0 +1,211 @@
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _write_behind_settings():
+    options = {
+        'ENABLED': True,
+        'MAX_BATCH': 200,
+        'MAX_PENDING': 5000,
+        'FLUSH_INTERVAL': 1.0,
+        'SESSION_CACHE_SIZE': 5000,
+    }
+    options.update(getattr(settings, 'CHAT_WRITE_BEHIND', {}))
+    return options
+
+
+class ChatMessageBuffer:
+    """Write-behind buffer that saves chat messages in batched transactions"""
+
+    def __init__(self):
+        self._setup()
+
+    def _setup(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_timestamp = None
+        self._sessions = OrderedDict()
+
+    @property
+    def enabled(self):
+        return _write_behind_settings()['ENABLED']
+
+    def _next_timestamp(self):
+        # Messages are stamped when they are queued, not when they are
+        # flushed, and stamps never repeat so order within a session holds.
+        now = timezone.now()
+        if self._last_timestamp is not None and now <= self._last_timestamp:
+            now = self._last_timestamp + timedelta(microseconds=1)
+        self._last_timestamp = now
+        return now
+
+    def resolve_session(self, session_id, language='sw'):
+        """Get or create a chat session, remembering it for later turns"""
+        session = self._cached_session(session_id)
+        if session is None:
+            session, created = ChatSession.objects.get_or_create(
+                session_id=session_id,
+                defaults={'language': language}
+            )
+            self._remember_session(session)
+        return session
+
+    async def aresolve_session(self, session_id, language='sw'):
+        """Async version of resolve_session"""
+        session = self._cached_session(session_id)
+        if session is None:
+            session, created = await ChatSession.objects.aget_or_create(
+                session_id=session_id,
+                defaults={'language': language}
+            )
+            self._remember_session(session)
+        return session
+
+    def _cached_session(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def _remember_session(self, session):
+        with self._lock:
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > _write_behind_settings()['SESSION_CACHE_SIZE']:
+                self._sessions.popitem(last=False)
+
+    def forget_session(self, session_id):
+        """Drop a session from the lookup cache"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def add(self, session, message_type, content, content_swahili='', is_processed=False):
+        """Queue a chat message for saving; saves immediately when disabled"""
+        chat_message, pending = self._queue(session, message_type, content, content_swahili, is_processed)
+        if pending is None:
+            chat_message.save()
+        elif pending >= _write_behind_settings()['MAX_PENDING']:
+            # The flusher is falling behind, so apply backpressure
+            self.flush()
+        return chat_message
+
+    def _queue(self, session, message_type, content, content_swahili, is_processed):
+        # Returns the message and the queue length, or None when not buffered
+        options = _write_behind_settings()
+        pending = None
+        with self._lock:
+            chat_message = ChatMessage(
+                session=session,
+                message_type=message_type,
+                content=content,
+                content_swahili=content_swahili,
+                is_processed=is_processed,
+                timestamp=self._next_timestamp()
+            )
+            if options['ENABLED']:
+                self._pending.append(chat_message)
+                pending = len(self._pending)
+
+        if pending is not None:
+            self._ensure_thread()
+            if options['MAX_BATCH'] <= pending < options['MAX_PENDING']:
+                self._wakeup.set()
+        return chat_message, pending
+
+    async def aadd(self, session, message_type, content, content_swahili='', is_processed=False):
+        """Async version of add"""
+        if self.enabled:
+            chat_message, pending = self._queue(session, message_type, content, content_swahili, is_processed)
+            if pending is not None and pending >= _write_behind_settings()['MAX_PENDING']:
+                # The ORM cannot run on the event loop
+                await sync_to_async(self.flush)()
+            return chat_message
+
+        with self._lock:
+            timestamp = self._next_timestamp()
+        return await ChatMessage.objects.acreate(
+            session=session,
+            message_type=message_type,
+            content=content,
+            content_swahili=content_swahili,
+            is_processed=is_processed,
+            timestamp=timestamp
+        )
+
+    def pending_for(self, session):
+        """Return queued messages of a session that are not saved yet"""
+        with self._lock:
+            return [message for message in self._pending if message.session_id == session.pk]
+
+    def flush(self):
+        """Save all queued messages in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create(batch, batch_size=_write_behind_settings()['MAX_BATCH'])
+            except Exception:
+                # One bad row (e.g. a deleted session) must not lose the
+                # whole batch, so fall back to saving rows one by one.
+                logger.exception('Bulk flush of %d chat messages failed', len(batch))
+                self._save_individually(batch)
+            return len(batch)
+
+    def _save_individually(self, batch):
+        for chat_message in batch:
+            try:
+                chat_message.save()
+            except Exception:
+                logger.exception('Dropping chat message for session %s', chat_message.session_id)
+                session = chat_message.session
+                self.forget_session(session.session_id)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(_write_behind_settings()['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Chat write-behind flush failed')
+            finally:
+                close_old_connections()
+
+    def after_fork(self):
+        """Start a forked child with an empty buffer and no flusher thread"""
+        self._setup()
+
+
+message_buffer = ChatMessageBuffer()
+
+# Celery prefork children leave with os._exit and skip atexit; they flush
+# from the worker_process_shutdown signal in wanjiku_ai/celery.py instead
+atexit.register(message_buffer.flush)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=message_buffer.after_fork)
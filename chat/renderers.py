@@ -0,0 +1,20 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def format_event(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renderer so text/event-stream clients pass content negotiation"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only plain responses such as validation errors reach the renderer;
+        # streams are returned as StreamingHttpResponse directly
+        return format_event('error', data).encode(self.charset)
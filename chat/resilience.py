@@ -0,0 +1,246 @@
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from .llm import LLMBusyError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _resilience_settings():
+    options = {
+        'DEADLINES': {'web': 15.0, 'sms': 8.0, 'ussd': 2.5},
+        'DEFAULT_DEADLINE': 15.0,
+        'WINDOW': 20,
+        'FAILURE_THRESHOLD': 5,
+        'SLOW_CALL_SECONDS': 8.0,
+        'OPEN_SECONDS': 30.0,
+        'FALLBACK_THRESHOLD': 0.25,
+    }
+    options.update(getattr(settings, 'LLM_RESILIENCE', {}))
+    return options
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call without trying it"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call has no time left before its deadline"""
+
+
+class Deadline:
+    """Absolute point in time a request has to be answered by"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def for_channel(cls, channel):
+        """Deadline configured for a channel such as 'web', 'sms' or 'ussd'"""
+        options = _resilience_settings()
+        return cls(options['DEADLINES'].get(channel, options['DEFAULT_DEADLINE']))
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self):
+        """Return the remaining seconds or raise DeadlineExceeded"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'Deadline of {self.seconds}s exceeded')
+        return remaining
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets in seconds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+
+    def observe(self, seconds):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._count += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        """Bucket counts keyed by upper bound, plus count and sum"""
+        with self._lock:
+            counts = list(self._counts)
+            total, elapsed = self._count, self._sum
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in self.buckets] + ['+Inf'], counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {'buckets': buckets, 'count': total, 'sum': round(elapsed, 3)}
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream keeps failing or answering too slowly
+
+    The breaker looks at the last WINDOW calls. Once FAILURE_THRESHOLD of
+    them failed or took longer than SLOW_CALL_SECONDS it opens and rejects
+    calls for OPEN_SECONDS, then lets a single probe through to decide
+    whether to close again.
+    """
+
+    def __init__(self, name, local_errors=()):
+        self.name = name
+        # Errors raised before the upstream is reached, e.g. no free local
+        # connection slot; they say nothing about its health
+        self.local_errors = tuple(local_errors)
+        self._lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self._reset()
+
+    def _reset(self):
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=_resilience_settings()['WINDOW'])
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """Return True when a call may be attempted now"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < _resilience_settings()['OPEN_SECONDS']:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def _record(self, ok, seconds):
+        self.latency.observe(seconds)
+        options = _resilience_settings()
+        bad = not ok or seconds > options['SLOW_CALL_SECONDS']
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if bad:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(bad)
+            if self.state == CLOSED and sum(self._outcomes) >= options['FAILURE_THRESHOLD']:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def cancel(self):
+        """Give up a call that was allowed without counting its outcome"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, seconds):
+        self._record(True, seconds)
+
+    def record_failure(self, seconds):
+        self._record(False, seconds)
+
+    def call(self, fn, deadline):
+        """Run fn(timeout) within the breaker and the remaining deadline"""
+        timeout = deadline.check()
+        if not self.allow():
+            raise CircuitOpenError(f'{self.name} circuit is open')
+        started = time.monotonic()
+        try:
+            result = fn(timeout)
+        except self.local_errors:
+            self.cancel()
+            raise
+        except Exception:
+            self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    async def acall(self, coroutine_fn, deadline):
+        """Async version of call; the coroutine is cancelled at the deadline"""
+        timeout = deadline.check()
+        if not self.allow():
+            raise CircuitOpenError(f'{self.name} circuit is open')
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(coroutine_fn(timeout), timeout)
+        except (asyncio.CancelledError,) + self.local_errors:
+            # The caller went away or no local slot was free; that says
+            # nothing about the upstream
+            self.cancel()
+            raise
+        except Exception:
+            self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def reset(self):
+        """Close the breaker and forget recent outcomes"""
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        """Breaker state, counters and the latency histogram"""
+        with self._lock:
+            state = self.state
+            if state == OPEN and time.monotonic() - self._opened_at >= _resilience_settings()['OPEN_SECONDS']:
+                state = HALF_OPEN
+            stats = {
+                'name': self.name,
+                'state': state,
+                'recent_failures': sum(self._outcomes),
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+        stats['latency'] = self.latency.snapshot()
+        return stats
+
+
+llm_breaker = CircuitBreaker('openai', local_errors=(LLMBusyError,))
+
+
+def fallback_response(message):
+    """Canned answer for when the LLM is unavailable or out of time
+
+    Uses the closest curated FAQ, service or intent answer, even below the
+    normal retrieval threshold, and otherwise lists the topics intents cover.
+    """
+    from .intents import get_intent_matcher
+    from .retrieval import find_answer
+
+    answer = find_answer(message, threshold=_resilience_settings()['FALLBACK_THRESHOLD'])
+    if answer:
+        return answer
+
+    topics = [intent.intent_name_swahili for intent in get_intent_matcher().intents[:5]]
+    response = "Samahani, huduma ya majibu ya kina haipatikani kwa sasa."
+    if topics:
+        response += " Ninaweza kukusaidia kuhusu: " + ", ".join(topics) + "."
+    return response
@@ -0,0 +1,234 @@
+import math
+import threading
+import time
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .text import normalize_message
+
+VERSION_CACHE_KEY = 'chat:retrieval:version'
+
+STOPWORDS = {
+    'na', 'ya', 'wa', 'za', 'la', 'cha', 'vya', 'kwa', 'ni', 'je', 'au', 'katika',
+    'kwenye', 'hii', 'hiyo', 'huu', 'hapa', 'pia', 'sana', 'tu', 'ndio', 'nini',
+    'the', 'a', 'an', 'of', 'to', 'for', 'and', 'is', 'in', 'how', 'do', 'i',
+}
+
+
+def retrieval_tokens(text):
+    """Normalized, stopword-free tokens used for indexing and querying"""
+    return [token for token in normalize_message(text).split() if token not in STOPWORDS]
+
+
+def _retrieval_settings():
+    options = {
+        'ENABLED': True,
+        'THRESHOLD': 0.6,
+        'REFRESH_SECONDS': 30,
+        'K1': 1.5,
+        'B': 0.75,
+    }
+    options.update(getattr(settings, 'FAQ_RETRIEVAL', {}))
+    return options
+
+
+class RetrievalIndex:
+    """In-memory BM25 index over curated answers, scored with NumPy"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._documents = {}
+        self._lock = threading.Lock()
+        self._compiled = None
+
+    def upsert(self, key, text, answer):
+        """Add or replace the document stored under key"""
+        tokens = Counter(retrieval_tokens(text))
+        with self._lock:
+            if tokens and answer:
+                self._documents[key] = (tokens, answer)
+            else:
+                self._documents.pop(key, None)
+            self._compiled = None
+
+    def remove(self, key):
+        """Remove the document stored under key"""
+        with self._lock:
+            if self._documents.pop(key, None) is not None:
+                self._compiled = None
+
+    def _compile(self):
+        # Postings hold the precomputed BM25 weight of each (term, document)
+        # pair, so a query is one vectorized add per query term.
+        keys = list(self._documents)
+        lengths = np.array([sum(self._documents[key][0].values()) for key in keys], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(keys) else 0.0
+
+        term_postings = {}
+        for index, key in enumerate(keys):
+            for term, frequency in self._documents[key][0].items():
+                term_postings.setdefault(term, []).append((index, frequency))
+
+        postings = {}
+        idf = {}
+        count = len(keys)
+        for term, entries in term_postings.items():
+            doc_ids = np.array([entry[0] for entry in entries], dtype=np.int32)
+            frequencies = np.array([entry[1] for entry in entries], dtype=np.float32)
+            idf[term] = math.log(1 + (count - len(entries) + 0.5) / (len(entries) + 0.5))
+            norms = self.k1 * (1 - self.b + self.b * lengths[doc_ids] / average_length)
+            postings[term] = (doc_ids, idf[term] * frequencies * (self.k1 + 1) / (frequencies + norms))
+
+        answers = [self._documents[key][1] for key in keys]
+        max_idf = math.log(1 + (count - 0.5) / 1.5) if count else 0.0
+        # Weight of a term found once in the shortest document: the best a
+        # real document matching each query term once can score
+        tf_one = 0.0
+        if count:
+            shortest = float(lengths.min()) / average_length
+            tf_one = (self.k1 + 1) / (1 + self.k1 * (1 - self.b + self.b * shortest))
+        return keys, answers, postings, idf, max_idf, tf_one
+
+    def _get_compiled(self):
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = self._compile()
+            return self._compiled
+
+    def search(self, query, limit=3):
+        """Return up to limit (score, key, answer) tuples, best first
+
+        Scores are normalized against a document that contains every query
+        term once and is as short as the shortest indexed document, so one
+        threshold works for short and long queries. Repeated terms can push
+        a score past that reference; it is capped at 1.
+        """
+        keys, answers, postings, idf, max_idf, tf_one = self._get_compiled()
+        terms = set(retrieval_tokens(query))
+        if not keys or not terms:
+            return []
+
+        scores = np.zeros(len(keys), dtype=np.float32)
+        for term in terms:
+            if term in postings:
+                doc_ids, weights = postings[term]
+                scores[doc_ids] += weights
+
+        ceiling = sum(idf.get(term, max_idf) for term in terms) * tf_one
+        if ceiling <= 0:
+            return []
+
+        limit = min(limit, len(keys))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (min(float(scores[index]) / ceiling, 1.0), keys[index], answers[index])
+            for index in top if scores[index] > 0
+        ]
+
+    def __len__(self):
+        return len(self._documents)
+
+
+def faq_document(faq):
+    return ('faq', faq.pk), f"{faq.question_swahili} {faq.question}", faq.answer_swahili
+
+
+def service_document(service):
+    answer = f"{service.name_swahili}: {service.description_swahili}"
+    if service.requirements_swahili:
+        answer += "\nMahitaji: " + ", ".join(service.requirements_swahili)
+    if service.processing_time_swahili:
+        answer += f"\nMuda: {service.processing_time_swahili}"
+    if service.cost is not None:
+        answer += f"\nGharama: KES {service.cost}"
+    return ('service', service.pk), f"{service.name_swahili} {service.name} {service.description_swahili}", answer
+
+
+def intent_document(intent):
+    keywords = ' '.join(str(keyword) for keyword in intent.keywords or [])
+    return ('intent', intent.pk), f"{intent.intent_name_swahili} {keywords}", intent.response_template_swahili
+
+
+def _load_index():
+    from services.models import GovernmentService, ServiceFAQ
+    from .models import SwahiliIntent
+
+    options = _retrieval_settings()
+    index = RetrievalIndex(k1=options['K1'], b=options['B'])
+    for faq in ServiceFAQ.objects.filter(is_active=True, service__is_active=True):
+        index.upsert(*faq_document(faq))
+    for service in GovernmentService.objects.filter(is_active=True):
+        index.upsert(*service_document(service))
+    for intent in SwahiliIntent.objects.filter(is_active=True):
+        index.upsert(*intent_document(intent))
+    return index
+
+
+_index = None
+_index_version = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_retrieval_index():
+    """Get the process-wide retrieval index, loading it on first use"""
+    global _index, _index_version, _index_checked_at
+    index = _index
+    now = time.monotonic()
+    if index is not None and now - _index_checked_at < _retrieval_settings()['REFRESH_SECONDS']:
+        return index
+
+    # Reload when another worker has changed the indexed models
+    with _index_lock:
+        version = cache.get(VERSION_CACHE_KEY, 0)
+        if _index is None or version != _index_version:
+            _index = _load_index()
+            _index_version = version
+        _index_checked_at = now
+        return _index
+
+
+def _bump_shared_version():
+    global _index_version
+    try:
+        version = cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        version = 1
+        cache.set(VERSION_CACHE_KEY, version, None)
+    if _index_version is not None:
+        _index_version = version
+
+
+def update_document(key, text, answer, active=True):
+    """Apply a saved model instance to the shared index"""
+    with _index_lock:
+        if _index is not None:
+            if active:
+                _index.upsert(key, text, answer)
+            else:
+                _index.remove(key)
+        _bump_shared_version()
+
+
+def remove_document(key):
+    """Drop a deleted model instance from the shared index"""
+    with _index_lock:
+        if _index is not None:
+            _index.remove(key)
+        _bump_shared_version()
+
+
+def find_answer(message, threshold=None):
+    """Return a curated answer for message when one scores above the threshold"""
+    options = _retrieval_settings()
+    if not options['ENABLED']:
+        return None
+    if threshold is None:
+        threshold = options['THRESHOLD']
+    results = get_retrieval_index().search(message, limit=1)
+    if results and results[0][0] >= threshold:
+        return results[0][2]
+    return None
@@ -1,47 +1,57 @@
-import openai
-import json
-from django.conf import settings
-from .models import SwahiliIntent, ChatSession, ChatMessage
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from .models import ChatSession, ChatMessage
+from .intents import detect_intent
+from .cache import get_response_cache
+from .persistence import message_buffer
+from .context import ConversationContextBuilder
+from .entities import get_entity_extractor
+from .retrieval import find_answer
+from .singleflight import llm_flight
+from .text import message_key
+from .resilience import Deadline, llm_breaker, fallback_response
+from .llm import (
+    get_openai_client, create_chat_completion, acreate_chat_completion,
+    astream_chat_completion, request_timeout, LLMBusyError
+)
 from services.models import GovernmentService
 
+LLM_ERROR_RESPONSE = "Samahani, sikuweza kukusaidia kwa sasa. Tafadhali jaribu tena baadaye."
+
 
 class SwahiliLLMService:
     """Service for handling Swahili language processing"""
     
     def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.context_builder = ConversationContextBuilder()
+    
+    @property
+    def openai_client(self):
+        """Pooled OpenAI client shared by every service in this process"""
+        return get_openai_client()
     
-    def process_swahili_message(self, message, session_id):
-        """Process a Swahili message and return appropriate response"""
+    def process_swahili_message(self, message, session_id, channel='web'):
+        """Process a Swahili message and return appropriate response
+        
+        channel ('web', 'sms' or 'ussd') selects how long the reply may take.
+        """
+        deadline = Deadline.for_channel(channel)
         try:
             # Get or create session
-            session, created = ChatSession.objects.get_or_create(
-                session_id=session_id,
-                defaults={'language': 'sw'}
-            )
+            session = message_buffer.resolve_session(session_id)
             
             # Save user message
-            ChatMessage.objects.create(
-                session=session,
-                message_type='user',
-                content=message,
-                content_swahili=message
-            )
+            message_buffer.add(session, 'user', message, message)
             
             # Detect intent
             intent = self._detect_intent(message)
             
             # Generate response
-            response = self._generate_response(message, intent, session)
+            response = self._generate_response(message, intent, session, deadline)
             
             # Save assistant response
-            ChatMessage.objects.create(
-                session=session,
-                message_type='assistant',
-                content=response,
-                content_swahili=response,
-                is_processed=True
-            )
+            message_buffer.add(session, 'assistant', response, response, is_processed=True)
             
             return response
             
@@ -50,60 +60,261 @@ class SwahiliLLMService:
     
     def _detect_intent(self, message):
         """Detect user intent from Swahili message"""
-        # Get all active intents
-        intents = SwahiliIntent.objects.filter(is_active=True)
+        # Keywords of all active intents are matched in a single pass;
+        # None means a general query
+        return detect_intent(message)
+    
+    def _generate_response(self, message, intent, session, deadline=None):
+        """Generate appropriate response based on intent"""
+        if deadline is None:
+            deadline = Deadline.for_channel('web')
+        
+        if intent:
+            return self._intent_response(intent)
         
-        message_lower = message.lower()
+        # Curated FAQ and service answers are served without a network call
+        faq_answer = find_answer(message)
+        if faq_answer:
+            return faq_answer
         
-        # Simple keyword matching for now
-        for intent in intents:
-            for keyword in intent.keywords:
-                if keyword.lower() in message_lower:
-                    return intent
+        context = self.context_builder.build(session, message)
         
-        # Default intent for general queries
-        return None
+        # Most unmatched questions repeat, so answer standalone ones from the cache first
+        response_cache = get_response_cache() if context.standalone else None
+        if response_cache is not None:
+            cached = response_cache.get(message)
+            if cached is not None:
+                return cached
+        
+        # Use OpenAI for general conversation
+        try:
+            if context.standalone:
+                # Identical questions in flight at the same time share one call
+                content = llm_flight.do(
+                    message_key(message), lambda: self._complete(context, deadline),
+                    timeout=deadline.remaining()
+                )
+            else:
+                content = self._complete(context, deadline)
+            
+            if response_cache is not None:
+                response_cache.set(message, content)
+            return content
+            
+        except Exception as e:
+            # Slow, failing or circuit-broken LLM: answer from curated content
+            return self._fallback_response(message)
     
-    def _generate_response(self, message, intent, session):
-        """Generate appropriate response based on intent"""
+    def _complete(self, context, deadline):
+        """Call OpenAI for a conversation context and return the reply text"""
+        request = self._llm_request(context)
+        
+        def complete(timeout):
+            response = create_chat_completion(
+                timeout=request_timeout(timeout), acquire_timeout=timeout, **request
+            )
+            return response.choices[0].message.content
+        
+        return llm_breaker.call(complete, deadline)
+    
+    def _fallback_response(self, message):
+        """Canned answer used when OpenAI cannot answer in time"""
+        try:
+            return fallback_response(message)
+        except Exception as e:
+            return LLM_ERROR_RESPONSE
+    
+    def _intent_response(self, intent):
+        """Build the response for a matched intent"""
+        # Use intent-specific response
+        response = intent.response_template_swahili
+        
+        # If it's a service-related intent, add service information
+        if intent.service_category:
+            services = GovernmentService.objects.filter(
+                category=intent.service_category,
+                is_active=True
+            )[:3]
+            
+            if services:
+                response += "\n\nHuduma zinazopatikana:\n"
+                for service in services:
+                    response += f"• {service.name_swahili}\n"
+        
+        return response
+    
+    def _llm_request(self, context):
+        """Build the chat completion arguments for a conversation context"""
+        return {
+            'model': "gpt-3.5-turbo",
+            'messages': context.messages,
+            'max_tokens': 200,
+            'temperature': 0.7,
+        }
+    
+    async def aprocess_swahili_message(self, message, session_id, channel='web'):
+        """Async version of process_swahili_message for ASGI views"""
+        deadline = Deadline.for_channel(channel)
+        try:
+            session = await self._asave_user_message(message, session_id)
+            intent = await self._adetect_intent(message)
+            response = await self._agenerate_response(message, intent, session, deadline)
+            await self._asave_assistant_message(session, response)
+            return response
+            
+        except Exception as e:
+            return f"Samahani, kuna tatizo. Tafadhali jaribu tena. (Sorry, there's an issue. Please try again.)"
+    
+    async def stream_swahili_message(self, message, session_id):
+        """Process a Swahili message, yielding the response as it is generated"""
+        session = await self._asave_user_message(message, session_id)
+        intent = await self._adetect_intent(message)
+        
+        faq_answer = None if intent else await self._afind_answer(message)
+        
         if intent:
-            # Use intent-specific response
-            response = intent.response_template_swahili
+            response = await self._aintent_response(intent)
+            yield response
+        elif faq_answer:
+            response = faq_answer
+            yield response
+        else:
+            context = await self._abuild_context(session, message)
+            response_cache = get_response_cache() if context.standalone else None
+            response = None
+            if response_cache is not None:
+                response = await sync_to_async(response_cache.get, thread_sensitive=False)(message)
             
-            # If it's a service-related intent, add service information
-            if intent.service_category:
-                services = GovernmentService.objects.filter(
+            if response is not None:
+                yield response
+            elif not llm_breaker.allow():
+                response = await self._afallback_response(message)
+                yield response
+            else:
+                # Forward tokens to the caller as soon as OpenAI produces them
+                parts = []
+                started = time.monotonic()
+                timeout = Deadline.for_channel('web').seconds
+                try:
+                    async for token in astream_chat_completion(
+                            timeout=request_timeout(timeout), acquire_timeout=timeout,
+                            **self._llm_request(context)):
+                        parts.append(token)
+                        yield token
+                except (GeneratorExit, asyncio.CancelledError):
+                    # The client disconnected mid-stream
+                    llm_breaker.cancel()
+                    raise
+                except LLMBusyError:
+                    # Local back-pressure, not an OpenAI failure
+                    llm_breaker.cancel()
+                    parts.append(await self._afallback_response(message))
+                    yield parts[0]
+                except Exception:
+                    llm_breaker.record_failure(time.monotonic() - started)
+                    if not parts:
+                        parts.append(await self._afallback_response(message))
+                        yield parts[0]
+                else:
+                    llm_breaker.record_success(time.monotonic() - started)
+                    if response_cache is not None:
+                        await sync_to_async(response_cache.set, thread_sensitive=False)(message, ''.join(parts))
+                response = ''.join(parts)
+        
+        # Persist the assistant message once the stream has finished
+        await self._asave_assistant_message(session, response)
+    
+    async def _asave_user_message(self, message, session_id):
+        """Get or create the session and save the user message"""
+        session = await message_buffer.aresolve_session(session_id)
+        await message_buffer.aadd(session, 'user', message, message)
+        return session
+    
+    async def _asave_assistant_message(self, session, response):
+        """Save the assistant response"""
+        await message_buffer.aadd(session, 'assistant', response, response, is_processed=True)
+    
+    async def _adetect_intent(self, message):
+        """Async version of _detect_intent"""
+        # Matching is in memory, but a matcher reload queries the DB, which
+        # must run in Django's thread so its connection is closed properly
+        return await sync_to_async(self._detect_intent)(message)
+    
+    async def _agenerate_response(self, message, intent, session, deadline=None):
+        """Async version of _generate_response"""
+        if deadline is None:
+            deadline = Deadline.for_channel('web')
+        
+        if intent:
+            return await self._aintent_response(intent)
+        
+        faq_answer = await self._afind_answer(message)
+        if faq_answer:
+            return faq_answer
+        
+        context = await self._abuild_context(session, message)
+        response_cache = get_response_cache() if context.standalone else None
+        if response_cache is not None:
+            cached = await sync_to_async(response_cache.get, thread_sensitive=False)(message)
+            if cached is not None:
+                return cached
+        
+        try:
+            if context.standalone:
+                content = await llm_flight.ado(
+                    message_key(message), lambda: self._acomplete(context, deadline),
+                    timeout=deadline.remaining()
+                )
+            else:
+                content = await self._acomplete(context, deadline)
+            
+            if response_cache is not None:
+                await sync_to_async(response_cache.set, thread_sensitive=False)(message, content)
+            return content
+            
+        except Exception as e:
+            return await self._afallback_response(message)
+    
+    async def _acomplete(self, context, deadline):
+        """Async version of _complete"""
+        request = self._llm_request(context)
+        
+        async def complete(timeout):
+            response = await acreate_chat_completion(
+                timeout=request_timeout(timeout), acquire_timeout=timeout, **request
+            )
+            return response.choices[0].message.content
+        
+        return await llm_breaker.acall(complete, deadline)
+    
+    async def _afallback_response(self, message):
+        """Async version of _fallback_response"""
+        return await sync_to_async(self._fallback_response)(message)
+    
+    async def _afind_answer(self, message):
+        """Async version of retrieval.find_answer"""
+        return await sync_to_async(find_answer)(message)
+    
+    async def _abuild_context(self, session, message):
+        """Async version of ConversationContextBuilder.build"""
+        return await sync_to_async(self.context_builder.build)(session, message)
+    
+    async def _aintent_response(self, intent):
+        """Async version of _intent_response"""
+        response = intent.response_template_swahili
+        
+        if intent.service_category:
+            services = [
+                service async for service in GovernmentService.objects.filter(
                     category=intent.service_category,
                     is_active=True
                 )[:3]
-                
-                if services:
-                    response += "\n\nHuduma zinazopatikana:\n"
-                    for service in services:
-                        response += f"• {service.name_swahili}\n"
-        
-        else:
-            # Use OpenAI for general conversation
-            try:
-                prompt = f"""
-                Wewe ni Wanjiku, msaidizi wa serikali wa Kenya. Jibu kwa Kiswahili kwa ufupi na kwa urahisi.
-                Swali: {message}
-                """
-                
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are Wanjiku, a helpful Kenyan government assistant. Respond in Swahili."},
-                        {"role": "user", "content": message}
-                    ],
-                    max_tokens=200,
-                    temperature=0.7
-                )
-                
-                return response.choices[0].message.content
-                
-            except Exception as e:
-                return "Samahani, sikuweza kukusaidia kwa sasa. Tafadhali jaribu tena baadaye."
+            ]
+            
+            if services:
+                response += "\n\nHuduma zinazopatikana:\n"
+                for service in services:
+                    response += f"• {service.name_swahili}\n"
         
         return response
     
@@ -123,27 +334,14 @@ class SwahiliNLPService:
     @staticmethod
     def extract_entities(text):
         """Extract entities from Swahili text"""
-        entities = {
-            'services': [],
-            'locations': [],
-            'dates': [],
-            'numbers': []
-        }
-        
-        # Simple entity extraction (can be enhanced with NER models)
-        service_keywords = {
-            'cheti cha kuzaliwa': 'birth_certificate',
-            'leseni ya biashara': 'business_license',
-            'kitambulisho': 'id_card',
-            'leseni ya kuendesha': 'driving_license',
-            'pasipoti': 'passport'
-        }
-        
-        for keyword, service in service_keywords.items():
-            if keyword in text.lower():
-                entities['services'].append(service)
-        
-        return entities
+        # Services, counties and towns, dates and numbers are found in one
+        # pass by a matcher compiled once from chat/data/gazetteer.json
+        return get_entity_extractor().extract(text)
+    
+    @staticmethod
+    def extract_entities_batch(texts):
+        """Extract entities from many Swahili texts, e.g. for analytics"""
+        return get_entity_extractor().extract_many(texts)
     
     @staticmethod
     def translate_to_english(swahili_text):
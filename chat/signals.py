@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from services.models import GovernmentService, ServiceFAQ
+from .models import ChatSession, SwahiliIntent
+from .persistence import message_buffer
+from . import intents, retrieval
+
+
+@receiver(post_save, sender=SwahiliIntent)
+def intent_saved(sender, instance, **kwargs):
+    """Apply saved intents to the shared intent matcher and retrieval index"""
+    transaction.on_commit(lambda: intents.update_intent(instance))
+    document = retrieval.intent_document(instance)
+    transaction.on_commit(lambda: retrieval.update_document(*document, active=instance.is_active))
+
+
+@receiver(post_delete, sender=SwahiliIntent)
+def intent_deleted(sender, instance, **kwargs):
+    """Remove deleted intents from the shared intent matcher and retrieval index"""
+    intent_id = instance.pk
+    transaction.on_commit(lambda: intents.remove_intent(intent_id))
+    transaction.on_commit(lambda: retrieval.remove_document(('intent', intent_id)))
+
+
+@receiver(post_save, sender=ServiceFAQ)
+def faq_saved(sender, instance, **kwargs):
+    """Apply saved FAQs to the shared retrieval index"""
+    document = retrieval.faq_document(instance)
+    transaction.on_commit(lambda: retrieval.update_document(*document, active=instance.is_active))
+
+
+@receiver(post_delete, sender=ServiceFAQ)
+def faq_deleted(sender, instance, **kwargs):
+    """Remove deleted FAQs from the shared retrieval index"""
+    key = ('faq', instance.pk)
+    transaction.on_commit(lambda: retrieval.remove_document(key))
+
+
+@receiver(post_save, sender=GovernmentService)
+def service_saved(sender, instance, **kwargs):
+    """Apply saved services to the shared retrieval index"""
+    document = retrieval.service_document(instance)
+    transaction.on_commit(lambda: retrieval.update_document(*document, active=instance.is_active))
+
+
+@receiver(post_delete, sender=GovernmentService)
+def service_deleted(sender, instance, **kwargs):
+    """Remove deleted services from the shared retrieval index"""
+    key = ('service', instance.pk)
+    transaction.on_commit(lambda: retrieval.remove_document(key))
+
+
+@receiver(post_delete, sender=ChatSession)
+def session_deleted(sender, instance, **kwargs):
+    """Stop buffering messages for deleted sessions"""
+    message_buffer.forget_session(instance.session_id)
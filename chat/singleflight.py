@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _single_flight_settings():
+    options = {
+        'ENABLED': True,
+        'SHARED': False,
+        'WAIT_TIMEOUT': 30.0,
+        'POLL_INTERVAL': 0.1,
+    }
+    options.update(getattr(settings, 'LLM_SINGLE_FLIGHT', {}))
+    return options
+
+
+class FlightTimeout(Exception):
+    """Raised to a caller whose identical call in flight did not finish in time"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls so only one of them does the work
+
+    Within a process, callers with the same key wait for the first one and
+    share its result. With SHARED enabled, workers also coordinate through
+    a lock and a short-lived result in the Django cache.
+    """
+
+    def __init__(self, namespace='chat:flight'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.executed = 0
+        self.deduplicated = 0
+        self.shared_deduplicated = 0
+        self.timed_out = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def do(self, key, fn, timeout=None):
+        """Run fn once for all concurrent callers using key and return its result
+
+        A caller that waits longer than timeout (WAIT_TIMEOUT by default)
+        for the call in flight gets FlightTimeout instead of running fn
+        itself, so a slow upstream is not hit once per waiting caller.
+        """
+        options = _single_flight_settings()
+        if not options['ENABLED']:
+            return fn()
+        if timeout is not None:
+            options['WAIT_TIMEOUT'] = min(timeout, options['WAIT_TIMEOUT'])
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            if not call.done.wait(options['WAIT_TIMEOUT']):
+                self._count('timed_out')
+                raise FlightTimeout(key)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn, options)
+            return call.result
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key, coroutine_fn, timeout=None):
+        """Async version of do for callers on the same event loop"""
+        options = _single_flight_settings()
+        if not options['ENABLED']:
+            return await coroutine_fn()
+        if timeout is not None:
+            options['WAIT_TIMEOUT'] = min(timeout, options['WAIT_TIMEOUT'])
+
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            self._count('deduplicated')
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), options['WAIT_TIMEOUT'])
+            except asyncio.TimeoutError:
+                self._count('timed_out')
+                raise FlightTimeout(key)
+            except asyncio.CancelledError:
+                # Only a cancelled leader is a reason to run the call ourselves
+                if not future.cancelled():
+                    raise
+            self._count('executed')
+            return await coroutine_fn()
+
+        future = calls[key] = loop.create_future()
+        self._count('executed')
+        try:
+            result = await coroutine_fn()
+            future.set_result(result)
+            return result
+        except Exception as error:
+            future.set_exception(error)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            # A cancelled leader resolves nothing; release its followers
+            if not future.done():
+                future.cancel()
+            calls.pop(key, None)
+            if not calls:
+                self._async_calls.pop(loop, None)
+
+    def _run_shared(self, key, fn, options):
+        if not options['SHARED']:
+            self._count('executed')
+            return fn()
+
+        lock_key = f'{self.namespace}:lock:{key}'
+        result_key = f'{self.namespace}:result:{key}'
+        wait_timeout = options['WAIT_TIMEOUT']
+
+        if cache.add(lock_key, 1, int(wait_timeout) + 1):
+            try:
+                self._count('executed')
+                result = fn()
+                cache.set(result_key, result, int(wait_timeout) + 1)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker holds the lock; wait for the result it publishes
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            result = cache.get(result_key)
+            if result is not None:
+                self._count('shared_deduplicated')
+                return result
+            if cache.get(lock_key) is None:
+                # The other worker failed without a result; try ourselves
+                break
+            if time.monotonic() >= deadline:
+                self._count('timed_out')
+                raise FlightTimeout(key)
+            time.sleep(options['POLL_INTERVAL'])
+
+        self._count('executed')
+        return fn()
+
+    def stats(self):
+        """Return how many calls ran and how many were deduplicated"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'deduplicated': self.deduplicated,
+                'shared_deduplicated': self.shared_deduplicated,
+                'timed_out': self.timed_out,
+                'in_flight': len(self._calls) + sum(len(calls) for calls in self._async_calls.values()),
+            }
+
+
+llm_flight = SingleFlight()
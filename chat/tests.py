@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase
+from .entities import EntityExtractor
+from .text import normalize_message
+
+
+class NormalizeMessageTests(SimpleTestCase):
+    def test_repeated_letters_are_folded(self):
+        self.assertEqual(normalize_message('Habariii'), 'habari')
+
+    def test_digit_runs_are_kept(self):
+        self.assertEqual(normalize_message('1000'), '1000')
+        self.assertEqual(normalize_message('shilingi 5000'), 'shilingi 5000')
+        self.assertEqual(normalize_message('ID 22211100'), 'id 22211100')
+
+
+class NumberWordTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.extractor = EntityExtractor.from_file()
+
+    def numbers(self, text):
+        return self.extractor.extract(text)['numbers']
+
+    def test_compound_numbers(self):
+        self.assertEqual(self.numbers('elfu ishirini na tano'), [25000])
+        self.assertEqual(self.numbers('mia tatu na hamsini'), [350])
+        self.assertEqual(self.numbers('kumi na moja'), [11])
+
+    def test_units_joined_by_na_stay_separate(self):
+        self.assertEqual(self.numbers('mbili na tatu'), [2, 3])
+        self.assertEqual(self.numbers('sita na saba'), [6, 7])
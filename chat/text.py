@@ -0,0 +1,67 @@
+import hashlib
+import re
+import unicodedata
+
+# Common Sheng and Swahili spelling variants folded to one form so that
+# the same question asked slightly differently produces the same key.
+# Only misspellings and translations of one word belong here; words that
+# merely relate (bei/pesa, nitapataje/nitapata) would make different
+# questions share a cached answer.
+SPELLING_VARIANTS = {
+    'kitambulsho': 'kitambulisho',
+    'kitambulishi': 'kitambulisho',
+    'kitambulicho': 'kitambulisho',
+    'kipande': 'kitambulisho',
+    'pasipot': 'pasipoti',
+    'pasporti': 'pasipoti',
+    'passport': 'pasipoti',
+    'lesseni': 'leseni',
+    'license': 'leseni',
+    'licence': 'leseni',
+    'certificate': 'cheti',
+    'ntapata': 'nitapata',
+    'natak': 'nataka',
+    'ninataka': 'nataka',
+    'niaje': 'habari',
+    'hujambo': 'habari',
+    'jambo': 'habari',
+    'aje': 'vipi',
+    'venye': 'vipi',
+    'pliz': 'tafadhali',
+    'plz': 'tafadhali',
+    'tafathali': 'tafadhali',
+    'tafadhal': 'tafadhali',
+    'asanti': 'asante',
+    'thenks': 'asante',
+    'thanks': 'asante',
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r'\s+')
+# Letters only: digit runs are amounts and ID numbers
+_REPEATED = re.compile(r'([^\W\d_])\1{2,}', re.UNICODE)
+
+
+def strip_accents(text):
+    """Remove diacritics from text"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free word tokens"""
+    text = strip_accents(text.lower())
+    text = _PUNCTUATION.sub(' ', text.replace("'", ''))
+    return text.split()
+
+
+def normalize_message(message):
+    """Fold case, whitespace, punctuation and spelling variants of a message"""
+    text = _REPEATED.sub(r'\1', message)
+    tokens = [SPELLING_VARIANTS.get(token, token) for token in tokenize(text)]
+    return _WHITESPACE.sub(' ', ' '.join(tokens)).strip()
+
+
+def message_key(message):
+    """Stable hash of the normalized form of a message"""
+    return hashlib.sha256(normalize_message(message).encode('utf-8')).hexdigest()
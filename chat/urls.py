@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ChatSessionViewSet, SwahiliIntentViewSet, ChatMessageViewSet
+from .views import ChatSessionViewSet, SwahiliIntentViewSet, ChatMessageViewSet, AsyncSendMessageView, LLMStatusView
 
 router = DefaultRouter()
 router.register(r'sessions', ChatSessionViewSet, basename='sessions')
@@ -8,5 +8,8 @@ router.register(r'intents', SwahiliIntentViewSet, basename='intents')
 router.register(r'messages', ChatMessageViewSet, basename='messages')
 
 urlpatterns = [
+    # Listed before the router so it is not taken for a session detail URL
+    path('sessions/send_message_async/', AsyncSendMessageView.as_view(), name='send_message_async'),
+    path('llm_status/', LLMStatusView.as_view(), name='llm_status'),
     path('', include(router.urls)),
 ]
@@ -1,11 +1,23 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import json
 import uuid
 from .models import ChatSession, ChatMessage, SwahiliIntent
 from .services import SwahiliLLMService, SwahiliNLPService
+from .intents import detect_intent
+from .renderers import EventStreamRenderer, format_event
+from .pagination import ChatMessageCursorPagination, messages_since
+from .resilience import llm_breaker
+from .singleflight import llm_flight
 from .serializers import ChatSessionSerializer, ChatMessageSerializer, SwahiliIntentSerializer
 
 
@@ -35,14 +47,49 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
             'timestamp': timezone.now().isoformat()
         })
     
+    @action(detail=False, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def stream_message(self, request):
+        """Send a message to Wanjiku and stream the reply as Server-Sent Events"""
+        message = request.data.get('message', '')
+        session_id = request.data.get('session_id', str(uuid.uuid4()))
+        
+        if not message:
+            return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        llm_service = SwahiliLLMService()
+        
+        async def events():
+            yield format_event('session', {'session_id': session_id})
+            parts = []
+            async for token in llm_service.stream_swahili_message(message, session_id):
+                parts.append(token)
+                yield format_event('token', {'text': token})
+            yield format_event('done', {
+                'response': ''.join(parts),
+                'session_id': session_id,
+                'timestamp': timezone.now().isoformat()
+            })
+        
+        # Tokens are only flushed as they arrive when served by the ASGI app
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
-        """Get chat history for a session"""
+        """Get chat history for a session, one page at a time"""
         session = self.get_object()
-        messages = ChatMessage.objects.filter(session=session).order_by('timestamp')
+        messages = ChatMessage.objects.filter(session=session)
         
-        serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        # `since` returns only messages newer than the given message id,
+        # for clients polling for new messages
+        messages = messages_since(messages, request.query_params.get('since'))
+        
+        paginator = ChatMessageCursorPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = ChatMessageSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def create_session(self, request):
@@ -59,6 +106,47 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSendMessageView(View):
+    """Async version of ChatSessionViewSet.send_message for the ASGI app"""
+    
+    async def post(self, request):
+        """Send a message to Wanjiku without holding a worker thread"""
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = request.POST
+        
+        if not hasattr(data, 'get'):
+            return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+        
+        message = data.get('message', '')
+        session_id = data.get('session_id') or str(uuid.uuid4())
+        
+        if not message:
+            return JsonResponse({'error': 'Message is required'}, status=400)
+        
+        llm_service = SwahiliLLMService()
+        response = await llm_service.aprocess_swahili_message(message, session_id)
+        
+        return JsonResponse({
+            'response': response,
+            'session_id': session_id,
+            'timestamp': timezone.now().isoformat()
+        })
+
+
+class LLMStatusView(APIView):
+    """Circuit breaker state and LLM latency of the worker serving the request"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({
+            'breaker': llm_breaker.stats(),
+            'coalescing': llm_flight.stats(),
+        })
+
+
 class SwahiliIntentViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Swahili intents"""
     queryset = SwahiliIntent.objects.filter(is_active=True)
@@ -77,16 +165,7 @@ class SwahiliIntentViewSet(viewsets.ReadOnlyModelViewSet):
         entities = SwahiliNLPService.extract_entities(text)
         
         # Find matching intent
-        intents = SwahiliIntent.objects.filter(is_active=True)
-        matched_intent = None
-        
-        for intent in intents:
-            for keyword in intent.keywords:
-                if keyword.lower() in text.lower():
-                    matched_intent = intent
-                    break
-            if matched_intent:
-                break
+        matched_intent = detect_intent(text)
         
         return Response({
             'intent': SwahiliIntentSerializer(matched_intent).data if matched_intent else None,
@@ -99,4 +178,12 @@ class ChatMessageViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
     permission_classes = [AllowAny]
+    pagination_class = ChatMessageCursorPagination
+    
+    def get_queryset(self):
+        queryset = self.queryset
+        session_id = self.request.query_params.get('session_id')
+        if session_id:
+            queryset = queryset.filter(session__session_id=session_id)
+        return messages_since(queryset, self.request.query_params.get('since'))
 
@@ -5,3 +5,7 @@ class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'documents'
 
+    def ready(self):
+        from wanjiku_ai.caching import watch_models
+        from .models import DocumentCategory, DocumentTemplate
+        watch_models(DocumentCategory, DocumentTemplate)
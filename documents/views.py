@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.http import FileResponse
 from .models import Document, DocumentCategory, DocumentTemplate
 from .serializers import DocumentSerializer, DocumentCategorySerializer, DocumentTemplateSerializer
+from wanjiku_ai.caching import CachedReadOnlyMixin
 
 
 class DocumentViewSet(viewsets.ModelViewSet):
@@ -50,18 +51,19 @@ class DocumentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class DocumentCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class DocumentCategoryViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for document categories"""
     queryset = DocumentCategory.objects.filter(is_active=True)
     serializer_class = DocumentCategorySerializer
     permission_classes = [IsAuthenticated]
 
 
-class DocumentTemplateViewSet(viewsets.ReadOnlyModelViewSet):
+class DocumentTemplateViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for document templates"""
     queryset = DocumentTemplate.objects.filter(is_active=True)
     serializer_class = DocumentTemplateSerializer
     permission_classes = [IsAuthenticated]
+    cached_actions = ('list', 'retrieve', 'by_type')
     
     @action(detail=False, methods=['get'])
     def by_type(self, request):
@@ -0,0 +1 @@
+"""Offline load testing tools: stand-in upstream APIs and gateway simulators"""
@@ -0,0 +1,529 @@
+"""
+End-to-end load and latency benchmarks for the chat, SMS, USSD, service
+search and document verification APIs.
+
+By default the whole stack runs in this process: a throwaway test
+database is seeded with load_initial_data, the stand-in APIs from
+loadtest.standin replace OpenAI and Africa's Talking, and requests go
+through Django's test client, so database queries per request can be
+counted. With --url the same traffic is sent over HTTP to a running
+server instead; pass --worker-pid to sample the memory of its workers.
+
+    python -m loadtest.bench run --mix citizen --concurrency 8 --duration 30
+    python -m loadtest.bench run --url http://127.0.0.1:8000 --token TOKEN --worker-pid 4242
+    python -m loadtest.bench compare loadtest/results/baseline.json loadtest/results/latest.json
+
+Each run writes its report to loadtest/results/ as JSON. A run exits
+with status 1 when a scenario fails on every request, e.g. on 403s.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+from .scenarios import MIXES, SCENARIOS, document_hash, new_user
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+BENCH_USERNAME = 'loadtest'
+SEEDED_DOCUMENTS = 20
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _rss_mb(pid='self', field='VmRSS'):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Track the resident memory of worker processes during a run"""
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.start_mb = {pid: _rss_mb(pid) for pid in pids}
+        self.peak_mb = dict(self.start_mb)
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for pid in self.pids:
+            rss = _rss_mb(pid)
+            if rss is not None and (self.peak_mb[pid] is None or rss > self.peak_mb[pid]):
+                self.peak_mb[pid] = rss
+
+    def stop(self):
+        self._stopped.set()
+        self.sample()
+        workers = {}
+        for pid in self.pids:
+            end = _rss_mb(pid)
+            workers[str(pid)] = {
+                'rss_start_mb': _round(self.start_mb[pid]),
+                'rss_end_mb': _round(end),
+                'rss_peak_mb': _round(self.peak_mb[pid]),
+            }
+        if self.pids == ['self']:
+            # ru_maxrss is in kilobytes on Linux
+            workers['self']['max_rss_mb'] = _round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        return workers
+
+
+def _round(value, digits=2):
+    return round(value, digits) if value is not None else None
+
+
+class ClientTransport:
+    """Send steps through Django's test client and count their queries"""
+
+    def __init__(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.get(username=BENCH_USERNAME)
+        self._local = threading.local()
+
+    def _client(self, authenticated):
+        from django.test import Client
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+        if authenticated not in clients:
+            client = Client(raise_request_exception=False)
+            if authenticated:
+                client.force_login(self.user)
+            clients[authenticated] = client
+        return clients[authenticated]
+
+    def send(self, step):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = self._client(step.authenticated)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if step.method == 'GET':
+                response = client.get(step.path)
+            else:
+                response = client.generic(step.method, step.path, step.body(), content_type=step.content_type)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(queries.captured_queries)
+
+    def close(self):
+        from django.db import connection
+        connection.close()
+
+
+class HTTPTransport:
+    """Send steps to a running server; query counts are not available"""
+
+    def __init__(self, base_url, token=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, step):
+        headers = {}
+        if step.method != 'GET':
+            headers['Content-Type'] = step.content_type
+        if step.authenticated and self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        request = Request(self.base_url + step.path, data=step.body(), headers=headers, method=step.method)
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            error.read()
+            status = error.code
+        except (URLError, OSError):
+            status = 0
+        return status, time.perf_counter() - started, None
+
+    def close(self):
+        pass
+
+
+class Recorder:
+    """Samples collected by all workers after the warm-up"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, scenario, status, seconds, queries):
+        with self._lock:
+            self.samples.append((scenario, status, seconds, queries))
+
+
+def _weighted_choice(rng, names, cumulative):
+    point = rng.random() * cumulative[-1]
+    for name, bound in zip(names, cumulative):
+        if point < bound:
+            return name
+    return names[-1]
+
+
+def run_workers(transport, options):
+    """Drive the mix with closed-loop workers; returns the recorder and measured seconds"""
+    mix = MIXES[options.mix]
+    names = sorted(mix)
+    cumulative = []
+    total = 0
+    for name in names:
+        total += mix[name]
+        cumulative.append(total)
+
+    recorder = Recorder()
+    started = time.monotonic()
+    measure_from = started + options.warmup
+    stop_at = measure_from + options.duration
+
+    def worker(index):
+        rng = random.Random(options.seed * 1000 + index)
+        users = [new_user(rng) for _ in range(options.users_per_worker)]
+        try:
+            while time.monotonic() < stop_at:
+                scenario = _weighted_choice(rng, names, cumulative)
+                for step in SCENARIOS[scenario](rng, rng.choice(users)):
+                    status, seconds, queries = transport.send(step)
+                    if time.monotonic() >= measure_from:
+                        recorder.add(scenario, status, seconds, queries)
+                if options.think_time:
+                    time.sleep(rng.expovariate(1 / options.think_time))
+        finally:
+            transport.close()
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(options.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, max(time.monotonic() - measure_from, 1e-9)
+
+
+def summarize(samples, seconds):
+    """Throughput, latency percentiles, errors and queries for a set of samples"""
+    latencies = sorted(sample[2] for sample in samples)
+    queries = [sample[3] for sample in samples if sample[3] is not None]
+    errors = sum(1 for sample in samples if not 200 <= sample[1] < 400)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': _round(errors / len(samples), 4) if samples else None,
+        'rps': _round(len(samples) / seconds),
+        'latency_ms': {
+            'mean': _round(1000 * sum(latencies) / len(latencies)) if latencies else None,
+            'p50': _round(1000 * percentile(latencies, 0.50)) if latencies else None,
+            'p95': _round(1000 * percentile(latencies, 0.95)) if latencies else None,
+            'p99': _round(1000 * percentile(latencies, 0.99)) if latencies else None,
+            'max': _round(1000 * latencies[-1]) if latencies else None,
+        },
+        'queries_per_request': {
+            'mean': _round(sum(queries) / len(queries)) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+    return summary
+
+
+def build_report(recorder, seconds, options, memory, standin_stats):
+    by_scenario = {}
+    for sample in recorder.samples:
+        by_scenario.setdefault(sample[0], []).append(sample)
+    return {
+        'meta': {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': options.url or 'in-process',
+            'mix': options.mix,
+            'concurrency': options.concurrency,
+            'duration': options.duration,
+            'warmup': options.warmup,
+            'seed': options.seed,
+            'openai_latency': options.openai_latency,
+            'openai_error_rate': options.openai_error_rate,
+        },
+        'overall': summarize(recorder.samples, seconds),
+        'scenarios': {name: summarize(samples, seconds) for name, samples in sorted(by_scenario.items())},
+        'memory': memory,
+        'standin': standin_stats,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_standin(options):
+    from .standin import StandinServer, build_parser
+    standin_options = build_parser().parse_args([
+        '--port', '0',
+        '--seed', str(options.seed),
+        '--openai-latency', options.openai_latency,
+        '--openai-error-rate', str(options.openai_error_rate),
+        '--token-interval', '0',
+        '--sms-latency', options.sms_latency,
+    ])
+    server = StandinServer(('127.0.0.1', 0), standin_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def setup_django(options, standin):
+    """Configure Django against the stand-in APIs and a seeded test database"""
+    base_url = f'http://127.0.0.1:{standin.server_address[1]}'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', options.settings)
+    os.environ['OPENAI_BASE_URL'] = base_url + '/v1'
+    os.environ['AFRICASTALKING_API_BASE_URL'] = base_url
+    for name, value in (('OPENAI_API_KEY', 'loadtest'), ('AFRICASTALKING_USERNAME', 'sandbox'),
+                        ('AFRICASTALKING_API_KEY', 'loadtest')):
+        os.environ.setdefault(name, value)
+    # There is no broker in-process; run SMS tasks inline so the webhook is
+    # measured with its reply rather than just the acknowledgement
+    os.environ.setdefault('CELERY_TASK_ALWAYS_EAGER', 'True')
+
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.test.utils import setup_databases, setup_test_environment
+
+    setup_test_environment()
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        # A file rather than shared-cache memory, so worker threads do not
+        # fail with "table is locked" on concurrent writes
+        database.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.mkdtemp(prefix='wanjiku-bench-'), 'bench.sqlite3')
+    old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=[])
+    seed_database()
+    return old_config
+
+
+def seed_database():
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from blockchain.models import DocumentVerification
+
+    call_command('load_initial_data', stdout=io.StringIO())
+    user = User.objects.create_user(BENCH_USERNAME, password=None)
+    DocumentVerification.objects.bulk_create([
+        DocumentVerification(
+            user=user,
+            document_type='birth_certificate',
+            document_hash=document_hash(index),
+            original_file=f'documents/original/bench-{index}.pdf',
+            status='verified' if index % 2 else 'pending',
+        )
+        for index in range(SEEDED_DOCUMENTS)
+    ])
+
+
+def teardown_django(old_config):
+    from django.db import connections
+    from django.test.utils import teardown_databases, teardown_test_environment
+    from chat.persistence import message_buffer
+
+    message_buffer.flush()
+    connections.close_all()
+    teardown_databases(old_config, verbosity=0)
+    teardown_test_environment()
+
+
+def run(options):
+    if options.mix not in MIXES:
+        raise SystemExit(f"Unknown mix '{options.mix}', choose from: {', '.join(sorted(MIXES))}")
+
+    standin = old_config = None
+    if options.url:
+        transport = HTTPTransport(options.url, options.token)
+        pids = options.worker_pid or []
+    else:
+        standin = start_standin(options)
+        old_config = setup_django(options, standin)
+        transport = ClientTransport()
+        pids = ['self']
+
+    sampler = MemorySampler(pids)
+    sampler.start()
+    try:
+        recorder, seconds = run_workers(transport, options)
+    finally:
+        memory = sampler.stop()
+        standin_stats = standin.state.stats() if standin else None
+        if standin:
+            standin.shutdown()
+        if old_config is not None:
+            teardown_django(old_config)
+
+    report = build_report(recorder, seconds, options, memory, standin_stats)
+    output = Path(options.output) if options.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{options.mix}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, sort_keys=True))
+
+    print_report(report)
+    print(f'\nResults written to {output}')
+    failing = failed_scenarios(report)
+    for name in failing:
+        print(f"Scenario '{name}' failed on every request; its timings measure the error path", file=sys.stderr)
+    regressions = []
+    if options.compare:
+        regressions = print_comparison(json.loads(Path(options.compare).read_text()), report, options.tolerance)
+    if failing or regressions:
+        sys.exit(1)
+
+
+def failed_scenarios(report):
+    """Scenarios whose every request returned an error status"""
+    return [
+        name for name, summary in report['scenarios'].items()
+        if summary['requests'] and summary['errors'] == summary['requests']
+    ]
+
+
+def print_report(report):
+    print(f"{'scenario':<10} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    rows = list(report['scenarios'].items()) + [('overall', report['overall'])]
+    for name, summary in rows:
+        latency = summary['latency_ms']
+        print(
+            f"{name:<10} {summary['requests']:>9} {summary['errors']:>7} {_cell(summary['rps']):>8} "
+            f"{_cell(latency['p50']):>9} {_cell(latency['p95']):>9} {_cell(latency['p99']):>9} "
+            f"{_cell(summary['queries_per_request']['mean']):>8}"
+        )
+    for worker, memory in (report['memory'] or {}).items():
+        print(f"memory {worker}: " + ', '.join(f'{key}={value}' for key, value in memory.items()))
+
+
+def _cell(value):
+    return '-' if value is None else value
+
+
+# (metric label, path into a summary, True when higher is better)
+COMPARED_METRICS = [
+    ('rps', ('rps',), True),
+    ('p50 ms', ('latency_ms', 'p50'), False),
+    ('p95 ms', ('latency_ms', 'p95'), False),
+    ('p99 ms', ('latency_ms', 'p99'), False),
+    ('queries', ('queries_per_request', 'mean'), False),
+    ('errors', ('error_rate',), False),
+]
+
+
+def _metric(summary, path):
+    for key in path:
+        summary = summary.get(key) if summary else None
+    return summary
+
+
+def compare_reports(baseline, current, tolerance):
+    """Rows of (scenario, metric, baseline, current, change, regressed)"""
+    rows = []
+    names = sorted(set(baseline['scenarios']) & set(current['scenarios'])) + ['overall']
+    for name in names:
+        before = baseline['overall'] if name == 'overall' else baseline['scenarios'][name]
+        after = current['overall'] if name == 'overall' else current['scenarios'][name]
+        for label, path, higher_is_better in COMPARED_METRICS:
+            old, new = _metric(before, path), _metric(after, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            worse = -change if higher_is_better else change
+            # Query counts are deterministic, so any increase is a regression
+            limit = 0 if label == 'queries' else tolerance
+            rows.append((name, label, old, new, change, worse > limit))
+    return rows
+
+
+def print_comparison(baseline, current, tolerance):
+    rows = compare_reports(baseline, current, tolerance)
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('started_at')}):")
+    print(f"{'scenario':<10} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, label, old, new, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<10} {label:<8} {old:>10} {new:>10} {change:>+8.1%}{flag}")
+    regressions = [row for row in rows if row[5]]
+    print(f'{len(regressions)} regression(s) beyond {tolerance:.0%}')
+    return regressions
+
+
+def compare(options):
+    baseline = json.loads(Path(options.baseline).read_text())
+    current = json.loads(Path(options.current).read_text())
+    if print_comparison(baseline, current, options.tolerance):
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Load and latency benchmarks for the Wanjiku APIs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run a benchmark and write its JSON report')
+    run_parser.add_argument('--mix', default='citizen', help=f"Traffic mix: {', '.join(sorted(MIXES))}")
+    run_parser.add_argument('--concurrency', type=int, default=8, help='Concurrent closed-loop workers')
+    run_parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5.0, help='Seconds run before measuring')
+    run_parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between scenarios')
+    run_parser.add_argument('--users-per-worker', type=int, default=20)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--settings', default='wanjiku_ai.settings')
+    run_parser.add_argument('--url', help='Benchmark a running server instead of running in-process')
+    run_parser.add_argument('--token', help='API token for authenticated endpoints with --url')
+    run_parser.add_argument('--worker-pid', action='append', type=int, help='Server worker to sample memory of')
+    run_parser.add_argument('--openai-latency', default='lognormal:0.8,0.4', help='In-process stand-in latency')
+    run_parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    run_parser.add_argument('--sms-latency', default='uniform:0.05,0.2')
+    run_parser.add_argument('--output', help='Report path (default: loadtest/results/<time>-<mix>.json)')
+    run_parser.add_argument('--compare', help='Baseline report to compare the run with')
+    run_parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser('compare', help='Compare two JSON reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown')
+    compare_parser.set_defaults(handler=compare)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    options.handler(options)
+
+
+if __name__ == '__main__':
+    main()
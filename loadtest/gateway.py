@@ -0,0 +1,75 @@
+"""
+Africa's Talking gateway side of inbound traffic.
+
+Africa's Talking calls our webhooks for incoming SMS and for every step of
+a USSD session. These helpers send the same form-encoded requests, so the
+webhooks can be exercised without a phone or the real gateway.
+"""
+
+import json
+import time
+import uuid
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+def _post_form(url, fields, timeout):
+    request = Request(
+        url,
+        data=urlencode(fields).encode('utf-8'),
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+    )
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            status, body = response.status, response.read()
+    except HTTPError as error:
+        status, body = error.code, error.read()
+    return status, body, time.perf_counter() - started
+
+
+def _decode(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode('utf-8', 'replace')
+
+
+def send_inbound_sms(app_url, phone_number, text, short_code='22384', timeout=30):
+    """Deliver an incoming SMS to the SMS webhook; returns (status, data, seconds)"""
+    status, body, elapsed = _post_form(f"{app_url.rstrip('/')}/api/sms/webhooks/sms/", {
+        'from': phone_number,
+        'to': short_code,
+        'text': text,
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'id': str(uuid.uuid4()),
+        'linkId': str(uuid.uuid4()),
+    }, timeout)
+    return status, _decode(body), elapsed
+
+
+def dial_ussd(app_url, phone_number, inputs, service_code='*384*123#', timeout=30):
+    """Walk a USSD session through inputs like a handset would
+
+    As on the real gateway, every step sends the whole input so far joined
+    with '*'. Returns a list of (status, data, seconds), one per screen.
+    """
+    url = f"{app_url.rstrip('/')}/api/sms/webhooks/ussd/"
+    session_id = f'ATUid_{uuid.uuid4().hex}'
+    screens = []
+    entered = []
+    for step in [None] + list(inputs):
+        if step is not None:
+            entered.append(str(step))
+        status, body, elapsed = _post_form(url, {
+            'sessionId': session_id,
+            'serviceCode': service_code,
+            'phoneNumber': phone_number,
+            'networkCode': '63902',
+            'text': '*'.join(entered),
+        }, timeout)
+        screens.append((status, _decode(body), elapsed))
+        if status >= 400:
+            break
+    return screens
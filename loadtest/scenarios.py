@@ -0,0 +1,156 @@
+"""
+Swahili traffic for the benchmark suite.
+
+A scenario turns a random generator into one or more steps, each a
+request against a single API channel. Mixes weight scenarios to resemble
+real traffic.
+"""
+
+import hashlib
+import json
+import uuid
+from urllib.parse import urlencode
+
+CHAT_MESSAGES = [
+    "Habari, nataka kupata kitambulisho cha taifa",
+    "Ninahitaji pasipoti, nifanye nini?",
+    "Cheti cha kuzaliwa kinapatikana wapi?",
+    "Leseni ya biashara inagharimu kiasi gani?",
+    "Ninawezaje kuomba leseni ya kuendesha gari?",
+    "Mahitaji ya pasipoti ni yapi?",
+    "Asante sana kwa msaada wako",
+    "Nimepoteza kitambulisho changu, nifanye nini?",
+    "Ofisi za huduma zinafunguliwa saa ngapi?",
+    "Nataka kujua kuhusu bima ya afya ya NHIF",
+    "Je, naweza kulipia huduma kwa M-Pesa?",
+    "Hati yangu imethibitishwa?",
+]
+
+SMS_MESSAGES = [
+    "Kitambulisho",
+    "Pasipoti bei gani",
+    "Cheti cha kuzaliwa mahitaji",
+    "Leseni ya biashara Nairobi",
+    "Msaada",
+    "Ofisi ya usajili Kisumu iko wapi",
+]
+
+# Each flow is the sequence of choices a user types after dialling
+USSD_FLOWS = [
+    [],
+    ['1'],
+    ['2'],
+    ['3'],
+    ['1', '1'],
+    ['nataka pasipoti'],
+]
+
+SEARCH_QUERIES = [
+    'kitambulisho', 'pasipoti', 'cheti cha kuzaliwa', 'leseni', 'biashara',
+    'passport', 'birth certificate', 'kuendesha gari', 'afya', 'elimu', 'kil',
+]
+
+PHONE_PREFIXES = ['+25470', '+25471', '+25472', '+25479', '+25411']
+
+
+class Step:
+    """One HTTP request of a scenario"""
+
+    def __init__(self, method, path, data=None, content_type='application/json', authenticated=False):
+        self.method = method
+        self.path = path
+        self.data = data
+        self.content_type = content_type
+        self.authenticated = authenticated
+
+    def body(self):
+        """Encoded request body for HTTP transports"""
+        if self.data is None or self.method == 'GET':
+            return None
+        if self.content_type == 'application/json':
+            return json.dumps(self.data).encode('utf-8')
+        return urlencode(self.data).encode('utf-8')
+
+
+def phone_number(rng):
+    return rng.choice(PHONE_PREFIXES) + ''.join(str(rng.randrange(10)) for _ in range(7))
+
+
+def document_hash(index):
+    """Hash of the index-th seeded verification document"""
+    return hashlib.sha256(f'bench-document-{index}'.encode('utf-8')).hexdigest()
+
+
+def chat(rng, user):
+    # Users keep their session, so later turns carry conversation context
+    return [Step('POST', '/api/chat/sessions/send_message/', {
+        'message': rng.choice(CHAT_MESSAGES),
+        'session_id': user['session_id'],
+    })]
+
+
+def sms(rng, user):
+    return [Step('POST', '/api/sms/webhooks/sms/', {
+        'from': user['phone_number'],
+        'to': '22384',
+        'text': rng.choice(SMS_MESSAGES),
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+    }, content_type='application/x-www-form-urlencoded')]
+
+
+def ussd(rng, user):
+    session_id = f'ATUid_{rng.getrandbits(64):016x}'
+    flow = rng.choice(USSD_FLOWS)
+    return [
+        Step('POST', '/api/sms/webhooks/ussd/', {
+            'sessionId': session_id,
+            'serviceCode': '*384*123#',
+            'phoneNumber': user['phone_number'],
+            'text': '*'.join(flow[:depth]),
+        }, content_type='application/x-www-form-urlencoded')
+        for depth in range(len(flow) + 1)
+    ]
+
+
+def search(rng, user):
+    return [Step(
+        'GET', '/api/services/services/search/?q=' + rng.choice(SEARCH_QUERIES).replace(' ', '+'),
+        authenticated=True
+    )]
+
+
+def verify(rng, user, documents=20):
+    # One in four hashes is unknown, as with mistyped or forged documents
+    index = rng.randrange(documents + documents // 3)
+    return [Step('POST', '/api/blockchain/verifications/verify_document/', {
+        'document_hash': document_hash(index),
+    }, authenticated=True)]
+
+
+SCENARIOS = {
+    'chat': chat,
+    'sms': sms,
+    'ussd': ussd,
+    'search': search,
+    'verify': verify,
+}
+
+MIXES = {
+    # Weekday traffic: feature phones dominate outside the cities
+    'citizen': {'chat': 30, 'sms': 25, 'ussd': 25, 'search': 15, 'verify': 5},
+    'web': {'chat': 60, 'search': 35, 'verify': 5},
+    'feature_phone': {'sms': 50, 'ussd': 50},
+    'chat': {'chat': 100},
+    'sms': {'sms': 100},
+    'ussd': {'ussd': 100},
+    'search': {'search': 100},
+    'verify': {'verify': 100},
+}
+
+
+def new_user(rng):
+    """Simulated citizen with a stable phone number and chat session"""
+    return {
+        'phone_number': phone_number(rng),
+        'session_id': str(uuid.UUID(int=rng.getrandbits(128))),
+    }
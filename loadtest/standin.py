@@ -0,0 +1,355 @@
+"""
+Local stand-in for the OpenAI and Africa's Talking APIs.
+
+Answers are deterministic for a given request and seed, so benchmark runs
+are reproducible offline. Latency, error rate and rate limits are set per
+upstream from the command line:
+
+    python -m loadtest.standin --port 8900 --seed 7 \
+        --openai-latency lognormal:0.8,0.5 --openai-error-rate 0.02 \
+        --openai-rate-limit 20 --sms-latency uniform:0.05,0.2
+
+Point the app at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    AFRICASTALKING_API_BASE_URL=http://127.0.0.1:8900
+
+GET /_standin/stats returns request counters and POST /_standin/reset
+clears them. Only the standard library is used.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+REPLIES = [
+    "Karibu! Ninaweza kukusaidia kupata huduma za serikali kama kitambulisho, pasipoti na leseni.",
+    "Ili kupata cheti cha kuzaliwa, tembelea ofisi ya usajili iliyo karibu nawe ukiwa na kadi ya kliniki.",
+    "Unaweza kuomba pasipoti mtandaoni kupitia eCitizen. Utahitaji kitambulisho na picha mbili.",
+    "Leseni ya biashara hutolewa na serikali ya kaunti. Gharama inategemea aina ya biashara yako.",
+    "Asante kwa swali lako. Tafadhali eleza zaidi ili nikusaidie vizuri.",
+]
+
+
+class LatencyModel:
+    """Latency distribution parsed from 'fixed:S', 'uniform:A,B', 'normal:MEAN,SD' or 'lognormal:MEDIAN,SIGMA'"""
+
+    def __init__(self, spec, rng):
+        kind, _, params = (spec or 'fixed:0').partition(':')
+        self.kind = kind
+        self.params = [float(value) for value in params.split(',') if value]
+        self.rng = rng
+        if kind not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f'Unknown latency distribution: {spec}')
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(self.params[0], self.params[1])
+        if self.kind == 'normal':
+            return max(0.0, self.rng.gauss(self.params[0], self.params[1]))
+        return self.rng.lognormvariate(math.log(self.params[0]), self.params[1])
+
+
+class TokenBucket:
+    """Requests-per-second limit with a burst of one second's worth"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class Upstream:
+    """Behaviour of one imitated API"""
+
+    def __init__(self, name, latency, error_rate, rate_limit, rng):
+        self.name = name
+        self.latency = LatencyModel(latency, rng)
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit)
+        self.rng = rng
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            return self.latency.sample()
+
+    def fails(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+class StandinState:
+    """Upstreams, counters and recently sent SMS shared by all handler threads"""
+
+    def __init__(self, options):
+        rng = random.Random(options.seed)
+        self.options = options
+        self.openai = Upstream('openai', options.openai_latency, options.openai_error_rate,
+                               options.openai_rate_limit, rng)
+        self.sms = Upstream('sms', options.sms_latency, options.sms_error_rate,
+                            options.sms_rate_limit, rng)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.sent = deque(maxlen=1000)
+            self._message_ids = 0
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def next_message_id(self):
+        with self._lock:
+            self._message_ids += 1
+            return f'ATXid_standin{self._message_ids:010d}'
+
+    def record_sms(self, message, recipients):
+        with self._lock:
+            self.sent.append({'message': message, 'to': recipients, 'at': time.time()})
+
+    def stats(self):
+        with self._lock:
+            return {'counters': dict(self.counters), 'sms_sent': len(self.sent)}
+
+
+def reply_for(messages, max_tokens):
+    """Deterministic reply chosen from the last user message"""
+    last = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    digest = int(hashlib.sha256(last.encode('utf-8')).hexdigest(), 16)
+    words = REPLIES[digest % len(REPLIES)].split()
+    # Roughly one token per word keeps max_tokens meaningful
+    return ' '.join(words[:max(1, max_tokens or len(words))])
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'WanjikuStandin/1.0'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.state.options.verbose:
+            super().log_message(format, *args)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _openai_error(self, status, message, error_type, headers=None):
+        self._send(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': None}},
+                   headers=headers)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/_standin/stats':
+            self._send(200, self.state.stats())
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        body = self._body()
+        if path == '/_standin/reset':
+            self.state.reset()
+            self._send(200, {'status': 'reset'})
+        elif path.endswith('/chat/completions'):
+            self._chat_completions(body)
+        elif path.endswith('/messaging'):
+            self._send_sms(body)
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _chat_completions(self, body):
+        upstream = self.state.openai
+        self.state.count('openai.requests')
+        if not upstream.bucket.take():
+            self.state.count('openai.rate_limited')
+            return self._openai_error(429, 'Rate limit reached', 'requests', {'Retry-After': '1'})
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return self._openai_error(400, 'Invalid JSON body', 'invalid_request_error')
+
+        delay = upstream.delay()
+        if upstream.fails():
+            time.sleep(delay)
+            self.state.count('openai.errors')
+            return self._openai_error(500, 'The server had an error while processing your request.', 'server_error')
+
+        content = reply_for(request.get('messages', []), request.get('max_tokens'))
+        completion_id = 'chatcmpl-' + hashlib.sha1(body).hexdigest()[:24]
+        model = request.get('model', 'gpt-3.5-turbo')
+        if request.get('stream'):
+            return self._stream_completion(completion_id, model, content, delay)
+
+        time.sleep(delay)
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in request.get('messages', []))
+        completion_tokens = len(content.split())
+        self._send(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+        self.state.count('openai.completions')
+
+    def _stream_completion(self, completion_id, model, content, delay):
+        # The first token arrives after the sampled latency, the rest are
+        # spaced by --token-interval, sent with chunked transfer encoding.
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(delay)
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            self._write_chunk(f'data: {json.dumps(payload)}\n\n')
+
+        chunk({'role': 'assistant', 'content': ''})
+        for position, word in enumerate(content.split(' ')):
+            chunk({'content': word if position == 0 else ' ' + word})
+            time.sleep(self.state.options.token_interval)
+        chunk({}, 'stop')
+        self._write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.state.count('openai.streams')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_sms(self, body):
+        upstream = self.state.sms
+        self.state.count('sms.requests')
+        if not upstream.bucket.take():
+            self.state.count('sms.rate_limited')
+            return self._send(429, b'Too Many Requests', 'text/plain')
+
+        form = parse_qs(body.decode('utf-8'))
+        message = form.get('message', [''])[0]
+        recipients = [number.strip() for number in form.get('to', [''])[0].split(',') if number.strip()]
+        time.sleep(upstream.delay())
+        if upstream.fails():
+            self.state.count('sms.errors')
+            return self._send(500, b'Internal Server Error', 'text/plain')
+        if not recipients:
+            return self._send(400, b'Must have to to send a message', 'text/plain')
+
+        self.state.record_sms(message, recipients)
+        self.state.count('sms.sent')
+        self._send(201, {
+            'SMSMessageData': {
+                'Message': f'Sent to {len(recipients)}/{len(recipients)} Total Cost: KES {0.8 * len(recipients):.4f}',
+                'Recipients': [
+                    {
+                        'statusCode': 101,
+                        'number': number,
+                        'status': 'Success',
+                        'cost': 'KES 0.8000',
+                        'messageId': self.state.next_message_id(),
+                    }
+                    for number in recipients
+                ],
+            }
+        })
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        self.state = StandinState(options)
+        super().__init__(address, StandinHandler)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stand-in for the OpenAI and Africa's Talking APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--openai-latency', default='lognormal:0.8,0.4')
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-rate-limit', type=float, default=0, help='Requests per second, 0 for none')
+    parser.add_argument('--token-interval', type=float, default=0.02, help='Seconds between streamed tokens')
+    parser.add_argument('--sms-latency', default='uniform:0.05,0.2')
+    parser.add_argument('--sms-error-rate', type=float, default=0.0)
+    parser.add_argument('--sms-rate-limit', type=float, default=0, help='Requests per second, 0 for none')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    return parser
+
+
+def serve(options):
+    server = StandinServer((options.host, options.port), options)
+    print(f'Stand-in APIs listening on http://{options.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    serve(build_parser().parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,10 @@ class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
 
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from wanjiku_ai.caching import watch_models
+        from .models import GovernmentService, ServiceFAQ
+        from . import signals
+        post_migrate.connect(signals.create_search_index, sender=self)
+        watch_models(GovernmentService, ServiceFAQ)
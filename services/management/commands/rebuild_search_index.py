@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from services.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for government services'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.setup()
+        count = backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {count} services with {backend.__class__.__name__}')
+        )
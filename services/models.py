@@ -25,6 +25,8 @@ class GovernmentService(models.Model):
     processing_time_swahili = models.CharField(max_length=100)
     cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Stemmed names and descriptions, kept up to date for full-text search
+    search_document = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -0,0 +1,225 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import DatabaseError, connection
+from chat.text import tokenize
+from .models import GovernmentService
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'services_governmentservice_fts'
+PG_INDEX = 'services_governmentservice_search_idx'
+
+# Longest first; only stripped when a stem of at least four letters remains
+SUFFIXES = ('ishwa', 'eshwa', 'isha', 'esha', 'iwa', 'ewa', 'ika', 'eka', 'wa', 'ia', 'ea')
+
+
+def stem(token):
+    """Light Swahili stemmer: drops the ku- infinitive and common verb extensions"""
+    if token.isdigit() or len(token) <= 4:
+        return token
+    if token.startswith('ku') and len(token) > 5:
+        token = token[2:]
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+    return token
+
+
+def search_terms(text):
+    """Tokenize and stem text the same way for documents and queries"""
+    return [stem(token) for token in tokenize(text)]
+
+
+def build_search_document(service):
+    """Stemmed text indexed for a service; names count twice to rank them higher"""
+    names = f"{service.name} {service.name_swahili}"
+    return ' '.join(search_terms(f"{names} {names} {service.description} {service.description_swahili}"))
+
+
+class ServiceSearchBackend:
+    """Ranked search over GovernmentService.search_document"""
+
+    def search(self, query, limit=20):
+        """Return active services matching query, most relevant first"""
+        terms = search_terms(query)
+        if not terms:
+            return []
+        ids = self._ranked_ids(terms, limit)
+        services = GovernmentService.objects.in_bulk(ids)
+        return [services[service_id] for service_id in ids if service_id in services and services[service_id].is_active]
+
+    def _ranked_ids(self, terms, limit):
+        raise NotImplementedError
+
+    def setup(self):
+        """Create the index structures for this backend"""
+
+    def index(self, service):
+        """Bring the index entry of one service up to date"""
+
+    def remove(self, service_id):
+        """Drop the index entry of a deleted service"""
+
+    def needs_rebuild(self):
+        """True when saved services are missing from the index, e.g. on an existing deployment"""
+        return GovernmentService.objects.filter(search_document='').exists()
+
+    def rebuild(self):
+        """Re-index every service"""
+        count = 0
+        for service in GovernmentService.objects.all().iterator():
+            document = build_search_document(service)
+            if document != service.search_document:
+                GovernmentService.objects.filter(pk=service.pk).update(search_document=document)
+                service.search_document = document
+            self.index(service)
+            count += 1
+        return count
+
+
+class SQLiteFTSSearchBackend(ServiceSearchBackend):
+    """SQLite FTS5 table with BM25 ranking and prefix indexes"""
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "search_document, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def needs_rebuild(self):
+        if super().needs_rebuild():
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {FTS_TABLE} LIMIT 1")
+            empty = cursor.fetchone() is None
+        return empty and GovernmentService.objects.exists()
+
+    def index(self, service):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [service.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, search_document) VALUES (%s, %s)",
+                [service.pk, service.search_document]
+            )
+
+    def remove(self, service_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [service_id])
+
+    def _match_expression(self, terms, operator):
+        # The last term is matched as a prefix so partial words autocomplete
+        quoted = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+        return f' {operator} '.join(quoted)
+
+    def _ranked_ids(self, terms, limit):
+        with connection.cursor() as cursor:
+            for operator in ('AND', 'OR'):
+                cursor.execute(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                    f"ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+                    [self._match_expression(terms, operator), limit]
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids or len(terms) == 1:
+                    return ids
+        return []
+
+
+class PostgresSearchBackend(ServiceSearchBackend):
+    """Postgres full-text search over a GIN-indexed tsvector expression"""
+
+    VECTOR = "to_tsvector('simple', search_document)"
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON services_governmentservice "
+                f"USING GIN ({self.VECTOR})"
+            )
+
+    def _ranked_ids(self, terms, limit):
+        # Terms only contain word characters, so they are safe in a tsquery
+        with connection.cursor() as cursor:
+            for operator in (' & ', ' | '):
+                tsquery = operator.join(terms[:-1] + [f'{terms[-1]}:*'])
+                cursor.execute(
+                    f"SELECT id FROM services_governmentservice "
+                    f"WHERE is_active AND {self.VECTOR} @@ to_tsquery('simple', %s) "
+                    f"ORDER BY ts_rank({self.VECTOR}, to_tsquery('simple', %s)) DESC, name "
+                    f"LIMIT %s",
+                    [tsquery, tsquery, limit]
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids or len(terms) == 1:
+                    return ids
+        return []
+
+
+class BasicSearchBackend(ServiceSearchBackend):
+    """Fallback for databases without full-text search: ranks by matched terms"""
+
+    def _ranked_ids(self, terms, limit):
+        queryset = GovernmentService.objects.filter(is_active=True)
+        candidates = {}
+        for term in terms:
+            for service_id, document in queryset.filter(search_document__contains=term).values_list('id', 'search_document'):
+                candidates[service_id] = document
+        words = {service_id: document.split() for service_id, document in candidates.items()}
+        ranked = sorted(
+            words,
+            key=lambda service_id: -sum(
+                1 for term in terms
+                for word in words[service_id] if word == term or word.startswith(term)
+            )
+        )
+        return ranked[:limit]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """Search backend for the configured database"""
+    name = getattr(settings, 'SERVICE_SEARCH_BACKEND', '') or connection.vendor
+    return BACKENDS.get(name, BasicSearchBackend)()
+
+
+MAX_SEARCH_LIMIT = 100
+
+_checked_backends = set()
+_checked_lock = threading.Lock()
+
+
+def ensure_search_index(backend):
+    """Build the index of backend once per process if it is empty"""
+    name = backend.__class__.__name__
+    if name in _checked_backends:
+        return
+    with _checked_lock:
+        if name in _checked_backends:
+            return
+        if backend.needs_rebuild():
+            logger.warning('Service search index is empty, rebuilding it with %s', name)
+            backend.setup()
+            backend.rebuild()
+        _checked_backends.add(name)
+
+
+def search_services(query, limit=20):
+    """Search active services, falling back to basic matching if the index is missing"""
+    # A negative LIMIT means no limit on SQLite and is an error on PostgreSQL
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    try:
+        backend = get_search_backend()
+        ensure_search_index(backend)
+        return backend.search(query, limit)
+    except DatabaseError:
+        logger.exception('Full-text service search failed, using basic search')
+        backend = BasicSearchBackend()
+        ensure_search_index(backend)
+        return backend.search(query, limit)
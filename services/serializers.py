@@ -5,7 +5,7 @@ from .models import GovernmentService, ServiceRequest, ServiceFAQ
 class GovernmentServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = GovernmentService
-        fields = '__all__'
+        exclude = ['search_document']
 
 
 class ServiceRequestSerializer(serializers.ModelSerializer):
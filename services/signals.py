@@ -0,0 +1,44 @@
+import logging
+from django.db import DatabaseError, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import GovernmentService
+from .search import build_search_document, get_search_backend
+
+logger = logging.getLogger(__name__)
+
+
+def _sync_index(method, *args):
+    # A missing index must never break saving a service; rebuild_search_index
+    # brings it back in sync
+    try:
+        getattr(get_search_backend(), method)(*args)
+    except DatabaseError:
+        logger.exception('Could not update the service search index')
+
+
+@receiver(pre_save, sender=GovernmentService)
+def update_search_document(sender, instance, **kwargs):
+    """Refresh the stemmed search text before a service is saved"""
+    instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=GovernmentService)
+def index_service(sender, instance, **kwargs):
+    """Keep the full-text index in sync with saved services"""
+    transaction.on_commit(lambda: _sync_index('index', instance))
+
+
+@receiver(post_delete, sender=GovernmentService)
+def unindex_service(sender, instance, **kwargs):
+    """Remove deleted services from the full-text index"""
+    service_id = instance.pk
+    transaction.on_commit(lambda: _sync_index('remove', service_id))
+
+
+def create_search_index(sender, **kwargs):
+    """Create full-text index structures after migrations and fill them if empty"""
+    backend = get_search_backend()
+    backend.setup()
+    if backend.needs_rebuild():
+        backend.rebuild()
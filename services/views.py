@@ -2,27 +2,28 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
 from .models import GovernmentService, ServiceRequest, ServiceFAQ
 from .serializers import GovernmentServiceSerializer, ServiceRequestSerializer, ServiceFAQSerializer
+from .search import search_services
+from wanjiku_ai.caching import CachedReadOnlyMixin
 
 
-class GovernmentServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class GovernmentServiceViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for government services"""
     queryset = GovernmentService.objects.filter(is_active=True)
     serializer_class = GovernmentServiceSerializer
+    cached_actions = ('list', 'retrieve', 'by_category')
     
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search services by name or description"""
+        """Search services by name or description, most relevant first"""
         query = request.query_params.get('q', '')
         if query:
-            queryset = self.queryset.filter(
-                Q(name__icontains=query) |
-                Q(name_swahili__icontains=query) |
-                Q(description__icontains=query) |
-                Q(description_swahili__icontains=query)
-            )
+            try:
+                limit = int(request.query_params.get('limit', 20))
+            except ValueError:
+                limit = 20
+            queryset = search_services(query, limit=limit)
         else:
             queryset = self.queryset
         
@@ -66,7 +67,7 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ServiceFAQViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceFAQViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for service FAQs"""
     queryset = ServiceFAQ.objects.filter(is_active=True)
     serializer_class = ServiceFAQSerializer
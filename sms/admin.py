@@ -1,13 +1,13 @@
 from django.contrib import admin
-from .models import SMSMessage, USSDSession, USSDMenu
+from .models import SMSMessage, USSDSession, USSDMenu, BroadcastCampaign
 
 
 @admin.register(SMSMessage)
 class SMSMessageAdmin(admin.ModelAdmin):
-    list_display = ['phone_number', 'message_type', 'status', 'created_at']
-    list_filter = ['message_type', 'status', 'created_at']
-    search_fields = ['phone_number', 'content']
-    readonly_fields = ['created_at', 'delivered_at']
+    list_display = ['phone_number', 'message_type', 'status', 'segments', 'created_at']
+    list_filter = ['message_type', 'status', 'encoding', 'created_at']
+    search_fields = ['phone_number', 'content', 'provider_message_id']
+    readonly_fields = ['provider_message_id', 'created_at', 'delivered_at']
 
 
 @admin.register(USSDSession)
@@ -23,3 +23,10 @@ class USSDMenuAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'step']
     search_fields = ['title', 'title_swahili']
 
+
+@admin.register(BroadcastCampaign)
+class BroadcastCampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'total_recipients', 'sent_count', 'failed_count', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['name', 'message']
+    readonly_fields = ['total_recipients', 'sent_count', 'failed_count', 'started_at', 'completed_at']
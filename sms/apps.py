@@ -5,3 +5,5 @@ class SmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sms'
 
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,204 @@
+import codecs
+import csv
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .dispatcher import SMSDispatcher
+from .models import BroadcastCampaign, BroadcastRecipient, SMSMessage
+from .utils import normalize_phone_number
+
+
+def _broadcast_settings():
+    options = {
+        'CHUNK_SIZE': 1000,
+        'INSERT_BATCH_SIZE': 1000,
+    }
+    options.update(getattr(settings, 'SMS_BROADCAST', {}))
+    return options
+
+
+def read_phone_numbers(uploaded_file):
+    """Yield phone numbers from a CSV upload one row at a time
+
+    Numbers are taken from a phone_number, phone or msisdn column when the
+    file has a header, otherwise from the first column. A first row is a
+    header when it names one of those columns or has no digits at all;
+    anything else is a number, so a bad first number is counted as invalid.
+    """
+    column = 0
+    rows = csv.reader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    for index, row in enumerate(rows):
+        if not row:
+            continue
+        if index == 0 and normalize_phone_number(row[0]) is None:
+            header = [cell.strip().lower() for cell in row]
+            names = [name for name in ('phone_number', 'phone', 'msisdn') if name in header]
+            if names:
+                column = header.index(names[0])
+                continue
+            if not any(character.isdigit() for cell in row for character in cell):
+                continue
+        if column < len(row):
+            yield row[column]
+
+
+def contact_phone_numbers(since=None):
+    """Yield every number that has texted us, optionally only since a date"""
+    messages = SMSMessage.objects.filter(message_type='incoming')
+    if since:
+        messages = messages.filter(created_at__gte=since)
+    yield from messages.order_by().values_list('phone_number', flat=True).distinct().iterator()
+
+
+def add_recipients(campaign, phone_numbers):
+    """Add numbers to a campaign in fixed-size batches; returns (added, invalid)
+
+    Numbers are normalized and duplicates are ignored, so the same list can
+    be uploaded twice. Memory use does not depend on the list size.
+    """
+    batch_size = _broadcast_settings()['INSERT_BATCH_SIZE']
+    before = campaign.recipients.count()
+    invalid = 0
+    batch = []
+    for phone_number in phone_numbers:
+        normalized = normalize_phone_number(phone_number)
+        if normalized is None:
+            invalid += 1
+            continue
+        batch.append(BroadcastRecipient(campaign=campaign, phone_number=normalized))
+        if len(batch) >= batch_size:
+            BroadcastRecipient.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        BroadcastRecipient.objects.bulk_create(batch, ignore_conflicts=True)
+
+    total = campaign.recipients.count()
+    BroadcastCampaign.objects.filter(pk=campaign.pk).update(total_recipients=total, updated_at=timezone.now())
+    campaign.total_recipients = total
+    return total - before, invalid
+
+
+def start_campaign(campaign):
+    """Start or resume sending a draft or paused campaign"""
+    from .tasks import enqueue, run_broadcast_campaign
+
+    now = timezone.now()
+    started = BroadcastCampaign.objects.filter(pk=campaign.pk, status__in=['draft', 'paused']).update(
+        status='running', started_at=campaign.started_at or now, updated_at=now
+    )
+    if started:
+        transaction.on_commit(lambda: enqueue(run_broadcast_campaign, campaign.pk))
+    campaign.refresh_from_db()
+    return bool(started)
+
+
+def pause_campaign(campaign):
+    """Stop a running campaign once its current chunk is sent"""
+    paused = BroadcastCampaign.objects.filter(pk=campaign.pk, status='running').update(
+        status='paused', updated_at=timezone.now()
+    )
+    campaign.refresh_from_db()
+    return bool(paused)
+
+
+def claim_recipients(campaign, limit):
+    """Mark up to limit pending recipients as sending and return the ones this worker got
+
+    Rows locked by another worker are skipped, and only rows updated with
+    this call's token are returned, so workers sending the same campaign
+    never claim the same recipient, also on SQLite.
+    """
+    pending = campaign.recipients.filter(status='pending').order_by('id')
+    with transaction.atomic():
+        ids = list(pending.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        BroadcastRecipient.objects.filter(pk__in=ids, status='pending').update(
+            status='sending', claimed_at=timezone.now(), claim_token=token
+        )
+    return list(BroadcastRecipient.objects.filter(pk__in=ids, status='sending', claim_token=token).order_by('id'))
+
+
+def send_next_chunk(campaign_id):
+    """Send the next chunk of a running campaign; returns True while more remain
+
+    Recipients are claimed in the database before sending and saved after
+    every provider call, so a crashed worker resumes after the last saved
+    batch instead of starting over, and concurrent workers share the list.
+    """
+    campaign = BroadcastCampaign.objects.filter(pk=campaign_id, status='running').first()
+    if campaign is None:
+        return False
+
+    recipients = claim_recipients(campaign, _broadcast_settings()['CHUNK_SIZE'])
+    if not recipients:
+        if not campaign.recipients.filter(status__in=['pending', 'sending']).exists():
+            now = timezone.now()
+            BroadcastCampaign.objects.filter(pk=campaign.pk, status='running').update(
+                status='completed', completed_at=now, updated_at=now
+            )
+        return False
+
+    dispatcher = SMSDispatcher()
+    batch_size = dispatcher.options['BATCH_SIZE']
+    done = 0
+    try:
+        for start in range(0, len(recipients), batch_size):
+            batch = recipients[start:start + batch_size]
+            messages = [
+                SMSMessage(
+                    phone_number=recipient.phone_number,
+                    message_type='outgoing',
+                    content=campaign.message,
+                    content_swahili=campaign.message,
+                    user=campaign.created_by,
+                    session_id=f'broadcast_{campaign.pk}'
+                )
+                for recipient in batch
+            ]
+            dispatcher.send(messages)
+
+            for recipient, message in zip(batch, messages):
+                recipient.status = 'sent' if message.status == 'sent' else 'failed'
+            sent = sum(1 for recipient in batch if recipient.status == 'sent')
+            with transaction.atomic():
+                BroadcastRecipient.objects.bulk_update(batch, ['status'])
+                BroadcastCampaign.objects.filter(pk=campaign.pk).update(
+                    sent_count=F('sent_count') + sent,
+                    failed_count=F('failed_count') + len(batch) - sent,
+                    updated_at=timezone.now()
+                )
+            done = start + len(batch)
+    finally:
+        # Recipients not sent go back to the list for the retry
+        unsent = [recipient.pk for recipient in recipients[done:]]
+        if unsent:
+            BroadcastRecipient.objects.filter(pk__in=unsent, status='sending').update(
+                status='pending', claimed_at=None
+            )
+    return True
+
+
+def campaign_stats(campaign):
+    """Progress, throughput and estimated time left of a campaign"""
+    processed = campaign.sent_count + campaign.failed_count
+    elapsed = None
+    rate = None
+    if campaign.started_at:
+        elapsed = ((campaign.completed_at or timezone.now()) - campaign.started_at).total_seconds()
+        rate = processed / elapsed if elapsed > 0 else None
+    remaining = max(campaign.total_recipients - processed, 0)
+    return {
+        'status': campaign.status,
+        'total_recipients': campaign.total_recipients,
+        'sent': campaign.sent_count,
+        'failed': campaign.failed_count,
+        'remaining': remaining,
+        'progress': round(processed / campaign.total_recipients, 4) if campaign.total_recipients else 0.0,
+        'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+        'messages_per_second': round(rate, 2) if rate else None,
+        'eta_seconds': round(remaining / rate) if rate and campaign.status == 'running' else None,
+    }
@@ -0,0 +1,125 @@
+import logging
+import math
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import DeliveryReport, SMSMessage
+
+logger = logging.getLogger(__name__)
+
+# Africa's Talking delivery report statuses
+REPORT_STATUSES = {
+    'Success': 'delivered',
+    'Sent': 'sent',
+    'Submitted': 'sent',
+    'Buffered': 'sent',
+    'Failed': 'failed',
+    'Rejected': 'failed',
+}
+
+# Only a higher rank replaces a status, so 'sent' never replaces a final
+# state and the first of delivered/failed stays
+STATUS_RANK = {'sent': 1, 'failed': 2, 'delivered': 2}
+
+SCHEDULE_KEY = 'sms:delivery:scheduled'
+
+
+def _delivery_report_settings():
+    options = {
+        'MAX_BATCH': 500,
+        'FLUSH_INTERVAL': 2.0,
+        'MAX_ATTEMPTS': 5,
+    }
+    options.update(getattr(settings, 'SMS_DELIVERY_REPORTS', {}))
+    return options
+
+
+def _replaces(status, current):
+    return STATUS_RANK[status] > STATUS_RANK.get(current, 0)
+
+
+def record_delivery_report(provider_message_id, provider_status, reported_at=None):
+    """Save one report for the next bulk update; returns False for unknown statuses
+
+    The report is in the database before the webhook answers, so the
+    provider never sees an acknowledged report that a restart could lose.
+    """
+    status = REPORT_STATUSES.get(provider_status)
+    if status is None or not provider_message_id:
+        return False
+    DeliveryReport.objects.create(
+        provider_message_id=provider_message_id,
+        status=status,
+        reported_at=reported_at or timezone.now()
+    )
+    transaction.on_commit(schedule_delivery_reports)
+    return True
+
+
+def schedule_delivery_reports():
+    """Queue one apply task per FLUSH_INTERVAL, however many reports arrive"""
+    from .tasks import apply_delivery_reports
+
+    interval = _delivery_report_settings()['FLUSH_INTERVAL']
+    if not cache.add(SCHEDULE_KEY, 1, math.ceil(interval)):
+        return
+    try:
+        apply_delivery_reports.apply_async(countdown=interval)
+    except Exception:
+        # The saved reports are picked up by the stale sweep
+        cache.delete(SCHEDULE_KEY)
+        logger.exception('Could not queue apply_delivery_reports')
+
+
+def apply_reports():
+    """Apply up to MAX_BATCH saved reports with one SELECT and one bulk UPDATE
+
+    Returns (applied, more). Reports are claimed with skip_locked, so
+    concurrent workers take different batches.
+    """
+    options = _delivery_report_settings()
+    with transaction.atomic():
+        reports = list(
+            DeliveryReport.objects.order_by('id').select_for_update(skip_locked=True)[:options['MAX_BATCH']]
+        )
+        if not reports:
+            return 0, False
+
+        # Reports come in arrival order; merge them per message
+        latest = {}
+        for report in reports:
+            current = latest.get(report.provider_message_id)
+            if current is None or _replaces(report.status, current.status):
+                latest[report.provider_message_id] = report
+
+        messages = SMSMessage.objects.filter(provider_message_id__in=list(latest)).only(
+            'id', 'provider_message_id', 'status', 'delivered_at'
+        )
+        changed = []
+        found = set()
+        for message in messages.iterator():
+            found.add(message.provider_message_id)
+            report = latest[message.provider_message_id]
+            if not _replaces(report.status, message.status):
+                continue
+            message.status = report.status
+            if report.status == 'delivered':
+                message.delivered_at = report.reported_at
+            changed.append(message)
+        SMSMessage.objects.bulk_update(changed, ['status', 'delivered_at'], batch_size=options['MAX_BATCH'])
+
+        # A report can arrive before the send result is saved; keep it a
+        # few more rounds before giving up on it.
+        done = {report.pk for report in reports if report.provider_message_id in found}
+        retry = [report for report in reports if report.provider_message_id not in found]
+        for report in retry:
+            report.attempts += 1
+            if report.attempts >= options['MAX_ATTEMPTS']:
+                logger.warning('Dropping delivery report for unknown message %s', report.provider_message_id)
+                done.add(report.pk)
+        DeliveryReport.objects.filter(pk__in=done).delete()
+        DeliveryReport.objects.bulk_update(
+            [report for report in retry if report.pk not in done], ['attempts'], batch_size=options['MAX_BATCH']
+        )
+    return len(changed), len(reports) >= options['MAX_BATCH']
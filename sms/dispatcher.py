@@ -0,0 +1,246 @@
+import logging
+import math
+import re
+import time
+import uuid
+import africastalking
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .encoding import segment_info
+from .models import SMSMessage
+
+logger = logging.getLogger(__name__)
+
+# Africa's Talking recipient status codes for accepted messages
+ACCEPTED_STATUS_CODES = {100, 101, 102}
+
+RATE_KEY = 'sms:dispatch:rate'
+
+
+def _dispatch_settings():
+    options = {
+        'BATCH_SIZE': 100,
+        'RATE_LIMIT': 5.0,
+        'MAX_MESSAGES': 500,
+    }
+    options.update(getattr(settings, 'SMS_DISPATCH', {}))
+    return options
+
+
+def get_sms_client():
+    """Initialized Africa's Talking SMS client"""
+    africastalking.initialize(
+        username=settings.AFRICASTALKING_USERNAME,
+        api_key=settings.AFRICASTALKING_API_KEY
+    )
+    sms = africastalking.SMS
+    if settings.AFRICASTALKING_API_BASE_URL:
+        # The SDK builds request URLs from _baseUrl, which has no public setter
+        sms._baseUrl = settings.AFRICASTALKING_API_BASE_URL.rstrip('/') + '/version1'
+    return sms
+
+
+def count_segments(message):
+    """Record the encoding and billed segments of an outgoing message"""
+    info = segment_info(message.content)
+    message.encoding = info.encoding
+    message.segments = info.segments
+    if message.original_segments is None:
+        message.original_segments = info.segments
+    return message
+
+
+def number_key(phone_number):
+    """Compare numbers by their last nine digits, as the provider echoes them in E.164"""
+    return re.sub(r'\D', '', phone_number or '')[-9:]
+
+
+class RateLimiter:
+    """Limit provider calls per second across every process sharing the cache
+
+    Calls are counted in one-second windows in the Django cache, so all
+    dispatchers (replies, queued messages and broadcasts) draw from one
+    budget. With a per-process cache the limit applies per process.
+    """
+
+    def __init__(self, rate, key=RATE_KEY):
+        self.rate = rate
+        self.key = key
+
+    def wait(self):
+        if not self.rate:
+            return
+        while True:
+            now = time.time()
+            key = f'{self.key}:{int(now)}'
+            cache.add(key, 0, 2)
+            try:
+                count = cache.incr(key)
+            except ValueError:
+                # The window expired between add and incr
+                continue
+            if count <= self.rate:
+                return
+            time.sleep(math.ceil(now) - now or 0.001)
+
+
+class SMSDispatcher:
+    """Send outgoing SMS with one provider call per batch of recipients sharing a text
+
+    Pending outgoing SMSMessage rows are the queue. Workers claim rows in
+    the database (pending -> sending) before sending, so no two workers send
+    the same message. Messages are grouped by content, split into batches
+    of at most BATCH_SIZE distinct numbers and sent no faster than
+    RATE_LIMIT calls per second overall. Results are written back with
+    bulk_create/bulk_update.
+    """
+
+    def __init__(self, sms_client=None):
+        self._sms = sms_client
+        self.options = _dispatch_settings()
+        self.rate_limiter = RateLimiter(self.options['RATE_LIMIT'])
+
+    @property
+    def sms(self):
+        if self._sms is None:
+            self._sms = get_sms_client()
+        return self._sms
+
+    def queue(self, phone_numbers, message, user=None, session_id='', original_segments=None, dispatch=True):
+        """Save pending messages to phone_numbers and, with dispatch, send them after commit"""
+        from .tasks import dispatch_outgoing_sms, enqueue
+
+        info = segment_info(message)
+        messages = SMSMessage.objects.bulk_create([
+            SMSMessage(
+                phone_number=phone_number,
+                message_type='outgoing',
+                content=message,
+                content_swahili=message,
+                status='pending',
+                user=user,
+                session_id=session_id or '',
+                encoding=info.encoding,
+                segments=info.segments,
+                original_segments=original_segments or info.segments
+            )
+            for phone_number in phone_numbers
+        ], batch_size=1000)
+        if dispatch:
+            transaction.on_commit(lambda: enqueue(dispatch_outgoing_sms))
+        return messages
+
+    def send(self, messages):
+        """Send messages now and save their results; returns the provider responses
+
+        Unsaved messages are created and saved ones updated. A network or
+        provider error is raised after the batches already sent are saved;
+        claimed messages not yet sent go back to pending.
+        """
+        responses = []
+        done = []
+        try:
+            for content, batch in self._batches(messages):
+                responses.append(self._send_batch(content, batch))
+                done.extend(batch)
+        finally:
+            self._save(done)
+            sent = {message.pk for message in done}
+            unsent = [message.pk for message in messages if message.pk is not None and message.pk not in sent]
+            if unsent:
+                SMSMessage.objects.filter(pk__in=unsent, status='sending').update(status='pending', claimed_at=None)
+        return responses
+
+    def claim(self, message_ids=None, limit=None):
+        """Mark pending outgoing messages as sending and return the ones this worker got
+
+        Rows locked by another worker are skipped, and only rows updated with
+        this call's token are returned, so concurrent dispatchers never claim
+        the same message, also where select_for_update is a no-op (SQLite).
+        """
+        pending = SMSMessage.objects.filter(message_type='outgoing', status='pending')
+        if message_ids is not None:
+            pending = pending.filter(pk__in=message_ids)
+        with transaction.atomic():
+            ids = list(
+                pending.order_by('created_at', 'id').select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:limit or self.options['MAX_MESSAGES']]
+            )
+            if not ids:
+                return []
+            token = uuid.uuid4().hex
+            SMSMessage.objects.filter(pk__in=ids, status='pending').update(
+                status='sending', claimed_at=timezone.now(), claim_token=token
+            )
+        return list(
+            SMSMessage.objects.filter(pk__in=ids, status='sending', claim_token=token).order_by('created_at', 'id')
+            .only('id', 'phone_number', 'content', 'status', 'provider_message_id', 'original_segments')
+        )
+
+    def send_now(self, message_ids):
+        """Claim and send the given pending messages right away, e.g. a conversational reply"""
+        messages = self.claim(message_ids, limit=len(message_ids))
+        if messages:
+            self.send(messages)
+        return messages
+
+    def dispatch(self):
+        """Send every pending outgoing message; returns how many were sent or failed"""
+        total = 0
+        while True:
+            claimed = self.claim()
+            if not claimed:
+                break
+            self.send(claimed)
+            total += len(claimed)
+        return total
+
+    def _batches(self, messages):
+        groups = {}
+        for message in messages:
+            groups.setdefault(message.content, []).append(message)
+        for content, group in groups.items():
+            # A number may appear once per call, so repeats go to later batches
+            batch = []
+            numbers = set()
+            for message in group:
+                key = number_key(message.phone_number)
+                if key in numbers or len(batch) >= self.options['BATCH_SIZE']:
+                    yield content, batch
+                    batch, numbers = [], set()
+                batch.append(message)
+                numbers.add(key)
+            if batch:
+                yield content, batch
+
+    def _send_batch(self, content, batch):
+        self.rate_limiter.wait()
+        response = self.sms.send(content, [message.phone_number for message in batch])
+        recipients = {
+            number_key(recipient.get('number')): recipient
+            for recipient in response.get('SMSMessageData', {}).get('Recipients', [])
+        }
+        for message in batch:
+            recipient = recipients.get(number_key(message.phone_number))
+            if recipient and recipient.get('statusCode') in ACCEPTED_STATUS_CODES:
+                message.status = 'sent'
+                message.provider_message_id = recipient.get('messageId', '')
+            else:
+                message.status = 'failed'
+                logger.warning(
+                    'SMS to %s rejected: %s', message.phone_number,
+                    recipient.get('status') if recipient else 'missing from provider response'
+                )
+        return response
+
+    def _save(self, done):
+        created = [message for message in done if message.pk is None]
+        updated = [message for message in done if message.pk is not None]
+        if created:
+            for message in created:
+                count_segments(message)
+            SMSMessage.objects.bulk_create(created, batch_size=1000)
+        if updated:
+            SMSMessage.objects.bulk_update(updated, ['status', 'provider_message_id'], batch_size=1000)
@@ -0,0 +1,150 @@
+import math
+import re
+import unicodedata
+from collections import namedtuple
+from django.conf import settings
+
+# GSM 03.38 default alphabet; extension characters take two septets
+GSM7_BASIC = set(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+GSM7_EXTENSION = set('^{}\\[~]|€\f')
+
+# Characters LLM replies commonly contain that would force UCS-2
+TRANSLITERATIONS = {
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '″': '"',
+    '–': '-', '—': '-', '‒': '-', '−': '-', '‐': '-', '‑': '-',
+    '…': '...', '•': '-', '·': '-', '●': '-',
+    ' ': ' ', ' ': ' ', ' ': ' ', '​': '',
+    '«': '"', '»': '"', '←': '<-', '→': '->',
+    '®': '(R)', '©': '(C)', '™': 'TM', '°': ' deg',
+    '\t': ' ',
+}
+
+# Applied only when a reply is over its segment budget
+ABBREVIATIONS = [
+    (r'Kitambulisho cha Taifa', 'ID'),
+    (r'Mamlaka ya Ushuru ya Kenya', 'KRA'),
+    (r'Kenya Revenue Authority', 'KRA'),
+    (r'Bima ya Afya ya Taifa', 'NHIF'),
+    (r'Mfuko wa Taifa wa Bima ya Afya', 'NHIF'),
+    (r'Hazina ya Taifa ya Akiba ya Jamii', 'NSSF'),
+    (r'Nambari ya Utambulisho wa Mlipa Ushuru', 'PIN'),
+    (r'Leseni ya Kuendesha Gari', 'DL'),
+    (r'kwa mfano', 'k.m.'),
+    (r'na kadhalika', 'n.k.'),
+    (r'Shilingi', 'KSh'),
+    (r'Serikali ya Kenya', 'Serikali'),
+    (r'Huduma Centre', 'Huduma'),
+    (r'ofisi ya karibu', 'ofisi'),
+]
+
+SegmentInfo = namedtuple('SegmentInfo', ['encoding', 'segments', 'units'])
+
+_MARKDOWN = re.compile(r'\*\*|__|^#+\s*', re.MULTILINE)
+_SPACES = re.compile(r'[ ]{2,}')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def _encoding_settings():
+    options = {
+        'ENABLED': True,
+        'MAX_SEGMENTS': 3,
+        'TRANSLITERATE': True,
+        'ABBREVIATE': True,
+    }
+    options.update(getattr(settings, 'SMS_ENCODING', {}))
+    return options
+
+
+def is_gsm7(text):
+    return all(char in GSM7_BASIC or char in GSM7_EXTENSION for char in text)
+
+
+def segment_info(text):
+    """Encoding, segment count and encoded length of an SMS body"""
+    if is_gsm7(text):
+        units = [2 if char in GSM7_EXTENSION else 1 for char in text]
+        total = sum(units)
+        if total <= 160:
+            return SegmentInfo('gsm7', 1, total)
+        # An escape sequence is never split across two segments
+        segments, used = 1, 0
+        for size in units:
+            if used + size > 153:
+                segments += 1
+                used = 0
+            used += size
+        return SegmentInfo('gsm7', segments, total)
+
+    total = len(text.encode('utf-16-le')) // 2
+    if total <= 70:
+        return SegmentInfo('ucs2', 1, total)
+    return SegmentInfo('ucs2', math.ceil(total / 67), total)
+
+
+def transliterate(text):
+    """Replace characters outside GSM-7 with the closest GSM-7 text"""
+    result = []
+    for char in text:
+        if char in GSM7_BASIC or char in GSM7_EXTENSION:
+            result.append(char)
+        elif char in TRANSLITERATIONS:
+            result.append(TRANSLITERATIONS[char])
+        else:
+            # Strip accents (ê -> e); symbols and emoji with no equivalent are dropped
+            decomposed = unicodedata.normalize('NFKD', char)
+            result.append(''.join(c for c in decomposed if c in GSM7_BASIC or c in GSM7_EXTENSION))
+    return ''.join(result)
+
+
+def abbreviate(text):
+    for pattern, replacement in ABBREVIATIONS:
+        text = re.sub(rf'\b{pattern}\b', replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+def truncate(text, max_segments):
+    """Cut text at a word boundary so it fits in max_segments"""
+    info = segment_info(text)
+    if info.segments <= max_segments:
+        return text
+    if info.encoding == 'gsm7':
+        capacity = 160 if max_segments == 1 else 153 * max_segments
+    else:
+        capacity = 70 if max_segments == 1 else 67 * max_segments
+    # Start from a cut that is about right and drop words until it fits
+    words = text[:capacity].split(' ')
+    while words:
+        candidate = ' '.join(words).rstrip(' ,.;:\n') + '...'
+        if segment_info(candidate).segments <= max_segments:
+            return candidate
+        words.pop()
+    return text[:capacity - 3] + '...'
+
+
+def compact(text, max_segments=None):
+    """Shrink an outgoing reply to as few segments as possible within the budget
+
+    Markdown and repeated whitespace are removed and characters outside
+    GSM-7 are transliterated. Abbreviations are applied only when the text
+    is still over budget, and truncation comes last.
+    """
+    options = _encoding_settings()
+    if not options['ENABLED'] or not text:
+        return text
+    if max_segments is None:
+        max_segments = options['MAX_SEGMENTS']
+
+    text = _MARKDOWN.sub('', text)
+    if options['TRANSLITERATE']:
+        text = transliterate(text)
+    text = _BLANK_LINES.sub('\n\n', _SPACES.sub(' ', text)).strip()
+
+    if max_segments and segment_info(text).segments > max_segments:
+        if options['ABBREVIATE']:
+            text = abbreviate(text)
+        text = truncate(text, max_segments)
+    return text
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _idempotency_settings():
+    options = {
+        'ENABLED': True,
+        'SHARED': True,
+        'MAX_ENTRIES': 10000,
+        'WINDOWS': {'sms': 60 * 60, 'ussd': 3 * 60},
+        'CLAIM_TIMEOUT': 60,
+        'WAIT_TIMEOUT': 5.0,
+        'POLL_INTERVAL': 0.1,
+    }
+    options.update(getattr(settings, 'SMS_IDEMPOTENCY', {}))
+    return options
+
+
+def webhook_key(kind, identifier, payload):
+    """Dedup key for a callback: provider identifier plus a hash of its payload"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return f'sms:webhook:{kind}:{identifier}:{hashlib.sha256(encoded).hexdigest()[:32]}'
+
+
+class WebhookDeduplicator:
+    """Process each provider callback once and replay its response to retries
+
+    Responses are kept for the kind's window in a bounded in-process LRU
+    and, with SHARED enabled, in the Django cache so that a retry landing on
+    another worker is answered too. A retry that arrives while the first
+    delivery is still being handled waits briefly for its response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+
+    def handle(self, kind, key, handler, pending_response, cacheable=None):
+        """Return handler() for a new callback, or the stored response of a replay"""
+        options = _idempotency_settings()
+        if not options['ENABLED'] or key is None:
+            return handler()
+
+        response = self._lookup(key, options)
+        if response is not None:
+            logger.info('Replaying response to duplicate %s webhook %s', kind, key)
+            return response
+
+        if not self._claim(key, options):
+            response = self._wait(key, options)
+            logger.info('Duplicate %s webhook %s arrived while the first was in flight', kind, key)
+            return response if response is not None else pending_response
+
+        try:
+            response = handler()
+            if cacheable is None or cacheable(response):
+                self._store(key, response, options['WINDOWS'][kind], options)
+            return response
+        finally:
+            self._release(key, options)
+
+    def _lookup(self, key, options):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    return response
+                del self._entries[key]
+        if options['SHARED']:
+            return cache.get(key)
+        return None
+
+    def _store(self, key, response, window, options):
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + window)
+            self._entries.move_to_end(key)
+            while len(self._entries) > options['MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+        if options['SHARED']:
+            cache.set(key, response, window)
+
+    def _claim(self, key, options):
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight[key] = threading.Event()
+        if options['SHARED'] and not cache.add(f'{key}:claim', 1, options['CLAIM_TIMEOUT']):
+            self._finish(key)
+            return False
+        return True
+
+    def _release(self, key, options):
+        if options['SHARED']:
+            cache.delete(f'{key}:claim')
+        self._finish(key)
+
+    def _finish(self, key):
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _wait(self, key, options):
+        deadline = time.monotonic() + options['WAIT_TIMEOUT']
+        while time.monotonic() < deadline:
+            with self._lock:
+                event = self._in_flight.get(key)
+            if event is not None:
+                event.wait(max(deadline - time.monotonic(), 0))
+            else:
+                time.sleep(options['POLL_INTERVAL'])
+            response = self._lookup(key, options)
+            if response is not None:
+                return response
+        return None
+
+
+webhook_dedup = WebhookDeduplicator()
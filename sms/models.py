@@ -14,6 +14,13 @@ class SMSMessage(models.Model):
         ('delivered', 'Delivered'),
         ('failed', 'Failed'),
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('sending', 'Sending'),
+    ]
+    
+    ENCODING_CHOICES = [
+        ('gsm7', 'GSM-7'),
+        ('ucs2', 'UCS-2'),
     ]
     
     phone_number = models.CharField(max_length=20)
@@ -23,8 +30,14 @@ class SMSMessage(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     session_id = models.CharField(max_length=100, blank=True)
+    provider_message_id = models.CharField(max_length=100, blank=True, db_index=True)
+    encoding = models.CharField(max_length=4, choices=ENCODING_CHOICES, default='gsm7')
+    segments = models.PositiveSmallIntegerField(default=1)
+    original_segments = models.PositiveSmallIntegerField(null=True, blank=True)  # Before compaction
     created_at = models.DateTimeField(auto_now_add=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Taken by a worker
+    claim_token = models.CharField(max_length=32, blank=True)
     
     class Meta:
         ordering = ['-created_at']
@@ -75,3 +88,64 @@ class USSDMenu(models.Model):
     def __str__(self):
         return f"{self.step}: {self.title_swahili}"
 
+
+class BroadcastCampaign(models.Model):
+    """Model for bulk SMS broadcasts to a recipient list"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('completed', 'Completed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    total_recipients = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class BroadcastRecipient(models.Model):
+    """Model for one phone number of a broadcast campaign"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    campaign = models.ForeignKey(BroadcastCampaign, on_delete=models.CASCADE, related_name='recipients')
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Taken by a sending worker
+    claim_token = models.CharField(max_length=32, blank=True)
+    
+    class Meta:
+        unique_together = ['campaign', 'phone_number']
+        indexes = [models.Index(fields=['campaign', 'status'])]
+    
+    def __str__(self):
+        return f"{self.campaign.name} - {self.phone_number}"
+
+
+class DeliveryReport(models.Model):
+    """Model for a provider delivery report waiting to be applied to its SMSMessage"""
+    provider_message_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=SMSMessage.STATUS_CHOICES)
+    reported_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)  # Rounds without a matching message
+    
+    def __str__(self):
+        return f"{self.provider_message_id}: {self.status}"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import SMSMessage, USSDSession, USSDMenu
+from .models import SMSMessage, USSDSession, USSDMenu, BroadcastCampaign
 
 
 class SMSMessageSerializer(serializers.ModelSerializer):
@@ -19,3 +19,12 @@ class USSDMenuSerializer(serializers.ModelSerializer):
         model = USSDMenu
         fields = '__all__'
 
+
+class BroadcastCampaignSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BroadcastCampaign
+        fields = '__all__'
+        read_only_fields = [
+            'status', 'created_by', 'total_recipients', 'sent_count', 'failed_count',
+            'started_at', 'completed_at', 'created_at', 'updated_at'
+        ]
@@ -1,43 +1,47 @@
-import africastalking
-from django.conf import settings
+import logging
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
 from .models import SMSMessage, USSDSession, USSDMenu
+from .dispatcher import SMSDispatcher, get_sms_client
+from .encoding import compact, segment_info
+from .sessions import sms_sessions
+from .ussd_menus import LABELS, get_ussd_menu, label
+from .ussd_store import get_session_store
 from chat.services import SwahiliLLMService
 import json
 
+logger = logging.getLogger(__name__)
+
 
 class SMSService:
     """Service for SMS operations"""
     
     def __init__(self):
-        africastalking.initialize(
-            username=settings.AFRICASTALKING_USERNAME,
-            api_key=settings.AFRICASTALKING_API_KEY
-        )
-        self.sms = africastalking.SMS
+        self.sms = get_sms_client()
+        self.dispatcher = SMSDispatcher(self.sms)
         self.llm_service = SwahiliLLMService()
     
     def send_sms(self, phone_number, message, user=None, session_id=None):
         """Send SMS message"""
         try:
-            # Send SMS via Africa's Talking
-            response = self.sms.send(message, [phone_number])
-            
-            # Save to database
-            sms_message = SMSMessage.objects.create(
+            original_segments = segment_info(message).segments
+            message = compact(message)
+            sms_message = SMSMessage(
                 phone_number=phone_number,
                 message_type='outgoing',
                 content=message,
                 content_swahili=message,
-                status='sent',
                 user=user,
-                session_id=session_id
+                session_id=session_id or '',
+                original_segments=original_segments
             )
+            # Send SMS via Africa's Talking and save the result
+            response = self.dispatcher.send([sms_message])[0]
             
             return {
-                'success': True,
+                'success': sms_message.status == 'sent',
                 'message_id': sms_message.id,
+                'provider_message_id': sms_message.provider_message_id,
                 'response': response
             }
             
@@ -47,6 +51,62 @@ class SMSService:
                 'error': str(e)
             }
     
+    def queue_sms(self, phone_numbers, message, user=None, session_id='', dispatch=True):
+        """Queue one text to many numbers, e.g. notifications, for batched sending"""
+        original_segments = segment_info(message).segments
+        return self.dispatcher.queue(
+            phone_numbers, compact(message), user=user, session_id=session_id,
+            original_segments=original_segments, dispatch=dispatch
+        )
+    
+    def receive_sms(self, phone_number, message):
+        """Save an incoming SMS and leave the reply to a background worker"""
+        from .tasks import enqueue, process_incoming_sms
+        
+        sms_message = SMSMessage.objects.create(
+            phone_number=phone_number,
+            message_type='incoming',
+            content=message,
+            content_swahili=message,
+            status='pending'
+        )
+        transaction.on_commit(lambda: enqueue(process_incoming_sms, sms_message.pk))
+        return sms_message
+    
+    def respond_to_incoming(self, sms_message):
+        """Generate the reply to a saved incoming SMS and send it"""
+        from .tasks import enqueue, dispatch_outgoing_sms
+        
+        # Claim the message before the LLM turn, so a redelivered task does
+        # not answer it a second time
+        claimed = SMSMessage.objects.filter(pk=sms_message.pk, status='pending').update(
+            status='processing', claimed_at=timezone.now()
+        )
+        if not claimed:
+            return None
+        
+        try:
+            # Messages from one number continue the same conversation
+            session_id = sms_sessions.resolve(sms_message.phone_number)
+            response = self.llm_service.process_swahili_message(sms_message.content, session_id, channel='sms')
+            
+            with transaction.atomic():
+                reply, = self.queue_sms([sms_message.phone_number], response, session_id=session_id, dispatch=False)
+                SMSMessage.objects.filter(pk=sms_message.pk).update(status='delivered')
+        except Exception:
+            # Hand the message back to the task's retry
+            SMSMessage.objects.filter(pk=sms_message.pk, status='processing').update(status='pending', claimed_at=None)
+            raise
+        
+        # Send the reply on its own instead of behind the batch queue; if
+        # that fails it stays pending for the dispatcher
+        try:
+            self.dispatcher.send_now([reply.pk])
+        except Exception:
+            logger.exception('Could not send reply %s', reply.pk)
+            enqueue(dispatch_outgoing_sms)
+        return reply
+    
     def process_incoming_sms(self, phone_number, message):
         """Process incoming SMS and generate response"""
         try:
@@ -60,8 +120,8 @@ class SMSService:
             )
             
             # Generate response using Swahili LLM
-            session_id = f"sms_{phone_number}_{int(timezone.now().timestamp())}"
-            response = self.llm_service.process_swahili_message(message, session_id)
+            session_id = sms_sessions.resolve(phone_number)
+            response = self.llm_service.process_swahili_message(message, session_id, channel='sms')
             
             # Send response SMS
             sms_result = self.send_sms(phone_number, response, session_id=session_id)
@@ -88,183 +148,56 @@ class USSDService:
     def process_ussd_request(self, session_id, phone_number, text):
         """Process USSD request"""
         try:
-            # Get or create session
-            session, created = USSDSession.objects.get_or_create(
-                session_id=session_id,
-                defaults={
-                    'phone_number': phone_number,
-                    'current_step': 'welcome',
-                    'expires_at': timezone.now() + timedelta(minutes=5)
-                }
-            )
+            # Live state stays in the session store; the database is written at the end
+            store = get_session_store()
+            session = store.load(session_id, phone_number)
+            if 'start_language' not in session.user_data:
+                # A new session opens in the language the caller chose last time
+                language = self._remembered_language(phone_number)
+                session.user_data.update(start_language=language, language=language)
             
-            if not created:
-                session.updated_at = timezone.now()
-                session.expires_at = timezone.now() + timedelta(minutes=5)
-                session.save()
+            # One lookup in the compiled menu graph; other input is a question.
+            # The input text repeats every choice, including language switches,
+            # so it is replayed from the language the session started in.
+            screen, question = get_ussd_menu().resolve(text, session.user_data['start_language'])
+            if screen is not None:
+                session.current_step = screen.step
+                session.user_data['language'] = screen.language
+                result = {
+                    'success': True,
+                    'response': screen.text,
+                    'session_id': session.session_id,
+                    'end': screen.end
+                }
+            else:
+                result = self._handle_text_input(session, question)
             
-            # Process based on current step
-            if text == '' or text == '0':
-                return self._show_welcome_menu(session)
-            elif text == '1':
-                return self._show_services_menu(session)
-            elif text == '2':
-                return self._show_documents_menu(session)
-            elif text == '3':
-                return self._show_help_menu(session)
-            elif text.startswith('1.'):
-                return self._handle_service_request(session, text)
-            elif text.startswith('2.'):
-                return self._handle_document_request(session, text)
+            if result.get('end'):
+                # A reused gateway session id must start over, not resume a finished flow
+                store.complete(session.session_id, session=session)
             else:
-                return self._handle_text_input(session, text)
+                store.save(session)
+            return result
                 
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
-                'response': 'Samahani, kuna tatizo. Tafadhali jaribu tena.'
+                'response': label('sw', 'error')
             }
     
-    def _show_welcome_menu(self, session):
-        """Show welcome menu"""
-        session.current_step = 'welcome'
-        session.save()
-        
-        response = """Karibu Wanjiku 2.0!
-Msaidizi wa Serikali wa Kenya
-
-Chagua:
-1. Huduma za Serikali
-2. Hati za Kidijitali
-3. Msaada
-
-0. Ondoka"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
-    
-    def _show_services_menu(self, session):
-        """Show services menu"""
-        session.current_step = 'services'
-        session.save()
-        
-        response = """Huduma za Serikali:
-
-1.1 Cheti cha Kuzaliwa
-1.2 Kitambulisho cha Taifa
-1.3 Leseni ya Biashara
-1.4 Leseni ya Kuendesha
-1.5 Pasipoti
-
-0. Rudi"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
-    
-    def _show_documents_menu(self, session):
-        """Show documents menu"""
-        session.current_step = 'documents'
-        session.save()
-        
-        response = """Hati za Kidijitali:
-
-2.1 Thibitisha Hati
-2.2 Pakia Hati
-2.3 Angalia Hati
-2.4 Historia ya Hati
-
-0. Rudi"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
-    
-    def _show_help_menu(self, session):
-        """Show help menu"""
-        session.current_step = 'help'
-        session.save()
-        
-        response = """Msaada:
-
-Wanjiku 2.0 ni msaidizi wako wa serikali.
-Anaweza kukusaidia na:
-- Huduma za serikali
-- Hati za kidijitali
-- Maelezo ya mchakato
-
-Andika swali lako au chagua huduma.
-
-0. Rudi"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
-    
-    def _handle_service_request(self, session, text):
-        """Handle service request"""
-        service_map = {
-            '1.1': 'Cheti cha Kuzaliwa',
-            '1.2': 'Kitambulisho cha Taifa',
-            '1.3': 'Leseni ya Biashara',
-            '1.4': 'Leseni ya Kuendesha',
-            '1.5': 'Pasipoti'
-        }
-        
-        service_name = service_map.get(text, 'Huduma')
-        
-        response = f"""Huduma: {service_name}
-
-Maelezo:
-- Gharama: Tazama huduma
-- Muda: Siku 7-30
-- Mahitaji: Cheti cha kuzaliwa, Picha
-
-Kwa maelezo zaidi, andika swali lako.
-
-0. Rudi"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
-    
-    def _handle_document_request(self, session, text):
-        """Handle document request"""
-        response = """Hati za Kidijitali:
-
-Kwa kutumia blockchain, hati zako zinaaminishwa.
-Unaweza:
-- Kupakia hati mpya
-- Kuthibitisha hati
-- Kuangalia historia
-
-Andika 'pakia' au 'thibitisha'
-
-0. Rudi"""
-        
-        return {
-            'success': True,
-            'response': response,
-            'session_id': session.session_id
-        }
+    def _remembered_language(self, phone_number):
+        language = (
+            USSDSession.objects.filter(phone_number=phone_number)
+            .values_list('user_data__language', flat=True).first()
+        )
+        return language if language in LABELS else 'sw'
     
     def _handle_text_input(self, session, text):
         """Handle free text input"""
         try:
             # Use Swahili LLM to process the text
-            response = self.llm_service.process_swahili_message(text, session.session_id)
+            response = self.llm_service.process_swahili_message(text, session.session_id, channel='ussd')
             
             # Limit response length for USSD
             if len(response) > 160:
@@ -280,24 +213,22 @@ Andika 'pakia' au 'thibitisha'
             return {
                 'success': False,
                 'error': str(e),
-                'response': 'Samahani, kuna tatizo. Tafadhali jaribu tena.'
+                'response': label(session.user_data.get('language', 'sw'), 'error')
             }
     
-    def end_session(self, session_id):
+    def end_session(self, session_id, status='completed', phone_number=None):
         """End USSD session"""
-        try:
-            session = USSDSession.objects.get(session_id=session_id)
-            session.status = 'completed'
-            session.save()
-            
-            return {
-                'success': True,
-                'message': 'Session ended'
-            }
-            
-        except USSDSession.DoesNotExist:
-            return {
-                'success': False,
-                'error': 'Session not found'
-            }
+        session = get_session_store().complete(session_id, status=status, phone_number=phone_number)
+        if session is None:
+            # Sessions from before the session store were saved on every hop
+            if not USSDSession.objects.filter(session_id=session_id).update(status=status):
+                return {
+                    'success': False,
+                    'error': 'Session not found'
+                }
+        
+        return {
+            'success': True,
+            'message': 'Session ended'
+        }
 
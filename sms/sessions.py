@@ -0,0 +1,65 @@
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from chat.models import ChatSession
+from .utils import normalize_phone_number
+
+
+def _session_settings():
+    options = {
+        'INACTIVITY_TIMEOUT': 30 * 60,
+    }
+    options.update(getattr(settings, 'SMS_SESSIONS', {}))
+    return options
+
+
+def session_key(phone_number):
+    """Stable form of a sender's number, whichever format the gateway used"""
+    return normalize_phone_number(phone_number) or re.sub(r'\D', '', phone_number or '')
+
+
+class SMSSessionResolver:
+    """Map a phone number to its active chat session id
+
+    Consecutive messages from one number share a session until it has been
+    idle for INACTIVITY_TIMEOUT seconds. The mapping lives in the cache and
+    every message extends it, so a resolve is one cache read and write. On a
+    cache miss the latest session with recent messages is looked up once,
+    which keeps conversations together when the web process and the Celery
+    workers do not share a cache.
+    """
+
+    def resolve(self, phone_number):
+        """Session id for the next message from phone_number"""
+        number = session_key(phone_number)
+        timeout = _session_settings()['INACTIVITY_TIMEOUT']
+        key = f'sms:session:{number}'
+
+        session_id = cache.get(key)
+        if session_id is None:
+            session_id = self._recent_session(number, timeout) or self._new_session_id(number)
+            # Two messages may arrive together; the first one to store its id wins
+            if not cache.add(key, session_id, timeout):
+                session_id = cache.get(key, session_id)
+        cache.set(key, session_id, timeout)
+        return session_id
+
+    def _new_session_id(self, number):
+        return f'sms_{number.lstrip("+")}_{int(timezone.now().timestamp())}'
+
+    def _recent_session(self, number, timeout):
+        cutoff = timezone.now() - timedelta(seconds=timeout)
+        return (
+            ChatSession.objects.filter(
+                session_id__startswith=f'sms_{number.lstrip("+")}_',
+                messages__timestamp__gte=cutoff
+            )
+            .order_by('-messages__timestamp')
+            .values_list('session_id', flat=True)
+            .first()
+        )
+
+
+sms_sessions = SMSSessionResolver()
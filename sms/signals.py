@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import USSDMenu
+from . import ussd_menus
+
+
+@receiver(post_save, sender=USSDMenu)
+def ussd_menu_saved(sender, instance, **kwargs):
+    """Recompile the USSD menu graph with the saved screen"""
+    transaction.on_commit(ussd_menus.reload_menus)
+
+
+@receiver(post_delete, sender=USSDMenu)
+def ussd_menu_deleted(sender, instance, **kwargs):
+    """Recompile the USSD menu graph without the deleted screen"""
+    transaction.on_commit(ussd_menus.reload_menus)
@@ -0,0 +1,128 @@
+import logging
+import random
+from datetime import timedelta
+from celery import shared_task
+from django.utils import timezone
+from .models import BroadcastCampaign, BroadcastRecipient, DeliveryReport, SMSMessage
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF = 5
+RETRY_BACKOFF_MAX = 300
+STALE_AFTER = timedelta(minutes=5)
+GIVE_UP_AFTER = timedelta(days=1)
+
+
+def retry_countdown(retries):
+    """Exponential backoff with full jitter, capped at RETRY_BACKOFF_MAX seconds"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** retries))
+
+
+def enqueue(task, *args):
+    """Queue a task, leaving the message pending for the stale sweep if the broker is down"""
+    try:
+        task.delay(*args)
+    except Exception:
+        logger.exception('Could not queue %s%r', task.name, args)
+
+
+@shared_task(bind=True, max_retries=5)
+def process_incoming_sms(self, message_id):
+    """Answer a saved incoming SMS and queue the reply"""
+    from .services import SMSService
+
+    sms_message = SMSMessage.objects.filter(pk=message_id, message_type='incoming', status='pending').first()
+    if sms_message is None:
+        return
+    try:
+        SMSService().respond_to_incoming(sms_message)
+    except Exception as error:
+        if self.request.retries >= self.max_retries:
+            SMSMessage.objects.filter(pk=message_id, status='pending').update(status='failed')
+            raise
+        raise self.retry(exc=error, countdown=retry_countdown(self.request.retries))
+
+
+@shared_task(bind=True, max_retries=5)
+def dispatch_outgoing_sms(self):
+    """Send all pending outgoing SMS in multi-recipient batches"""
+    from .dispatcher import SMSDispatcher
+
+    try:
+        return SMSDispatcher().dispatch()
+    except Exception as error:
+        # Unsent messages stay pending for the retry or the stale sweep
+        raise self.retry(exc=error, countdown=retry_countdown(self.request.retries))
+
+
+@shared_task(bind=True, max_retries=20)
+def run_broadcast_campaign(self, campaign_id):
+    """Send one chunk of a broadcast campaign and queue the next"""
+    from .broadcasts import send_next_chunk
+
+    try:
+        more = send_next_chunk(campaign_id)
+    except Exception as error:
+        # Recipients already sent are saved, so the retry continues with the rest
+        raise self.retry(exc=error, countdown=retry_countdown(self.request.retries))
+    if more:
+        enqueue(run_broadcast_campaign, campaign_id)
+
+
+@shared_task
+def apply_delivery_reports():
+    """Apply saved delivery reports in bulk and queue the next round while any remain"""
+    from .delivery import apply_reports, schedule_delivery_reports
+
+    applied, more = apply_reports()
+    if more:
+        enqueue(apply_delivery_reports)
+    elif DeliveryReport.objects.exists():
+        # Reports for messages whose send result is not saved yet
+        schedule_delivery_reports()
+    return applied
+
+
+@shared_task
+def requeue_stale_sms():
+    """Queue again messages and campaigns left behind, e.g. while the broker was unreachable"""
+    now = timezone.now()
+    # Incoming messages whose worker died during the LLM turn
+    SMSMessage.objects.filter(
+        message_type='incoming',
+        status='processing',
+        claimed_at__lt=now - STALE_AFTER,
+        created_at__gte=now - GIVE_UP_AFTER,
+    ).update(status='pending', claimed_at=None)
+    # Outgoing messages whose dispatcher died between claiming and saving
+    SMSMessage.objects.filter(
+        message_type='outgoing',
+        status='sending',
+        claimed_at__lt=now - STALE_AFTER,
+    ).update(status='pending', claimed_at=None)
+    stale = SMSMessage.objects.filter(
+        status='pending',
+        created_at__lt=now - STALE_AFTER,
+        created_at__gte=now - GIVE_UP_AFTER,
+    )
+    count = 0
+    for message_id in stale.filter(message_type='incoming').values_list('id', flat=True).iterator():
+        enqueue(process_incoming_sms, message_id)
+        count += 1
+    if stale.filter(message_type='outgoing').exists():
+        enqueue(dispatch_outgoing_sms)
+        count += 1
+    # Broadcast recipients claimed by a worker that died
+    BroadcastRecipient.objects.filter(
+        status='sending',
+        claimed_at__lt=now - STALE_AFTER,
+    ).update(status='pending', claimed_at=None)
+    if DeliveryReport.objects.exists():
+        enqueue(apply_delivery_reports)
+        count += 1
+    # Running campaigns that made no progress lately lost their worker
+    stalled = BroadcastCampaign.objects.filter(status='running', updated_at__lt=now - STALE_AFTER)
+    for campaign_id in stalled.values_list('id', flat=True):
+        enqueue(run_broadcast_campaign, campaign_id)
+        count += 1
+    return count
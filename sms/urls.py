@@ -1,14 +1,20 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SMSMessageViewSet, USSDSessionViewSet, USSDMenuViewSet, SMSWebhookView, USSDWebhookView
+from .views import (
+    SMSMessageViewSet, USSDSessionViewSet, USSDMenuViewSet, BroadcastCampaignViewSet,
+    SMSWebhookView, USSDWebhookView, USSDSessionEndWebhookView, DeliveryReportWebhookView
+)
 
 router = DefaultRouter()
 router.register(r'sms', SMSMessageViewSet, basename='sms')
 router.register(r'ussd/sessions', USSDSessionViewSet, basename='ussd-sessions')
 router.register(r'ussd/menus', USSDMenuViewSet, basename='ussd-menus')
+router.register(r'broadcasts', BroadcastCampaignViewSet, basename='broadcasts')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('webhooks/sms/', SMSWebhookView.as_view(), name='sms_webhook'),
     path('webhooks/ussd/', USSDWebhookView.as_view(), name='ussd_webhook'),
+    path('webhooks/ussd/end/', USSDSessionEndWebhookView.as_view(), name='ussd_session_end_webhook'),
+    path('webhooks/delivery/', DeliveryReportWebhookView.as_view(), name='delivery_report_webhook'),
 ]
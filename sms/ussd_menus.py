@@ -0,0 +1,323 @@
+"""
+USSD menus compiled from USSDMenu rows.
+
+Each row is one screen and replaces the default screen of the same step;
+an inactive row removes it. Its options (and options_swahili) list the
+choices in order, either as plain labels or as {"label": ..., "next":
+step} to lead to another screen. The graph is walked from the welcome
+step and every reachable input path ("", "1", "1*2", ...) is rendered to
+a screen per language in advance, so a hop is a single dictionary lookup.
+'9' on the welcome screen switches between Swahili and English.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from django.conf import settings
+from django.core.cache import cache
+from .models import USSDMenu
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_KEY = 'sms:ussd_menus:version'
+
+ROOT_STEP = 'welcome'
+BACK = '0'
+HOME = '00'
+SWITCH_LANGUAGE = '9'
+
+LABELS = {
+    'sw': {
+        'back': 'Rudi', 'exit': 'Ondoka', 'switch': 'English',
+        'goodbye': 'Asante kwa kutumia Wanjiku 2.0. Kwaheri!',
+        'error': 'Samahani, kuna tatizo. Tafadhali jaribu tena.',
+    },
+    'en': {
+        'back': 'Back', 'exit': 'Exit', 'switch': 'Kiswahili',
+        'goodbye': 'Thank you for using Wanjiku 2.0. Goodbye!',
+        'error': 'Sorry, something went wrong. Please try again.',
+    },
+}
+
+# Language that SWITCH_LANGUAGE leads to from each language
+OTHER_LANGUAGE = {'sw': 'en', 'en': 'sw'}
+
+Screen = namedtuple('Screen', ['step', 'text', 'end', 'language'])
+
+
+def label(language, name):
+    """Fixed USSD text in language, Swahili for unknown languages"""
+    return LABELS.get(language, LABELS['sw'])[name]
+
+
+def _service_screen(step, name, name_swahili):
+    return {
+        'step': step,
+        'title': f'Service: {name}',
+        'title_swahili': f'Huduma: {name_swahili}',
+        'description': '- Fee: See service\n- Time: 7-30 days\n- Requirements: Birth certificate, Photo\n\n'
+                       'For more details, type your question.',
+        'description_swahili': '- Gharama: Tazama huduma\n- Muda: Siku 7-30\n'
+                               '- Mahitaji: Cheti cha kuzaliwa, Picha\n\nKwa maelezo zaidi, andika swali lako.',
+        'options': [],
+        'options_swahili': [],
+    }
+
+
+# Used until operators add USSDMenu rows
+DEFAULT_MENUS = [
+    {
+        'step': 'welcome',
+        'title': 'Welcome to Wanjiku 2.0!',
+        'title_swahili': 'Karibu Wanjiku 2.0!',
+        'description': 'Kenya Government Assistant\n\nChoose:',
+        'description_swahili': 'Msaidizi wa Serikali wa Kenya\n\nChagua:',
+        'options': [
+            {'label': 'Government Services', 'next': 'services'},
+            {'label': 'Digital Documents', 'next': 'documents'},
+            {'label': 'Help', 'next': 'help'},
+        ],
+        'options_swahili': ['Huduma za Serikali', 'Hati za Kidijitali', 'Msaada'],
+    },
+    {
+        'step': 'services',
+        'title': 'Government Services:',
+        'title_swahili': 'Huduma za Serikali:',
+        'description': '',
+        'description_swahili': '',
+        'options': [
+            {'label': 'Birth Certificate', 'next': 'service_birth_certificate'},
+            {'label': 'National ID', 'next': 'service_national_id'},
+            {'label': 'Business Permit', 'next': 'service_business_permit'},
+            {'label': 'Driving Licence', 'next': 'service_driving_licence'},
+            {'label': 'Passport', 'next': 'service_passport'},
+        ],
+        'options_swahili': [
+            'Cheti cha Kuzaliwa', 'Kitambulisho cha Taifa', 'Leseni ya Biashara', 'Leseni ya Kuendesha', 'Pasipoti',
+        ],
+    },
+    _service_screen('service_birth_certificate', 'Birth Certificate', 'Cheti cha Kuzaliwa'),
+    _service_screen('service_national_id', 'National ID', 'Kitambulisho cha Taifa'),
+    _service_screen('service_business_permit', 'Business Permit', 'Leseni ya Biashara'),
+    _service_screen('service_driving_licence', 'Driving Licence', 'Leseni ya Kuendesha'),
+    _service_screen('service_passport', 'Passport', 'Pasipoti'),
+    {
+        'step': 'documents',
+        'title': 'Digital Documents:',
+        'title_swahili': 'Hati za Kidijitali:',
+        'description': '',
+        'description_swahili': '',
+        'options': [
+            {'label': 'Verify Document', 'next': 'document_info'},
+            {'label': 'Upload Document', 'next': 'document_info'},
+            {'label': 'View Documents', 'next': 'document_info'},
+            {'label': 'Document History', 'next': 'document_info'},
+        ],
+        'options_swahili': ['Thibitisha Hati', 'Pakia Hati', 'Angalia Hati', 'Historia ya Hati'],
+    },
+    {
+        'step': 'document_info',
+        'title': 'Digital Documents:',
+        'title_swahili': 'Hati za Kidijitali:',
+        'description': 'Blockchain keeps your documents trustworthy. You can upload, verify '
+                       "and view their history.\n\nType 'upload' or 'verify'",
+        'description_swahili': 'Blockchain huaminisha hati zako. Unaweza kupakia, kuthibitisha '
+                               "na kuangalia historia.\n\nAndika 'pakia' au 'thibitisha'",
+        'options': [],
+        'options_swahili': [],
+    },
+    {
+        'step': 'help',
+        'title': 'Help:',
+        'title_swahili': 'Msaada:',
+        'description': 'Wanjiku 2.0 is your government assistant for services, digital '
+                       'documents and processes.\n\nType your question or choose a service.',
+        'description_swahili': 'Wanjiku 2.0 ni msaidizi wako wa serikali wa huduma, hati za '
+                               'kidijitali na michakato.\n\nAndika swali lako au chagua huduma.',
+        'options': [],
+        'options_swahili': [],
+    },
+]
+
+
+def _menu_settings():
+    options = {
+        'SCREEN_LENGTH': 160,
+        'MAX_DEPTH': 8,
+        'REFRESH_SECONDS': 30,
+    }
+    options.update(getattr(settings, 'USSD_MENUS', {}))
+    return options
+
+
+def _field(menu, name):
+    if isinstance(menu, dict):
+        return menu.get(name)
+    return getattr(menu, name)
+
+
+def _option(option):
+    """(label, next step) of an option entry"""
+    if isinstance(option, dict):
+        return option.get('label', ''), option.get('next')
+    return str(option), None
+
+
+class USSDMenuGraph:
+    """Immutable lookup from USSD input paths to pre-rendered screens"""
+
+    def __init__(self, menus, screen_length=160, max_depth=8):
+        self.screen_length = screen_length
+        self._menus = {}
+        for menu in menus:
+            self._menus.setdefault(_field(menu, 'step'), menu)
+        # A welcome screen with nine or more options keeps '9' for itself
+        root = self._menus.get(ROOT_STEP)
+        self.can_switch = root is not None and len(_field(root, 'options') or []) < int(SWITCH_LANGUAGE)
+
+        screens = {language: {} for language in LABELS}
+        if ROOT_STEP in self._menus:
+            self._walk(screens, (), ROOT_STEP, (), max_depth)
+        else:
+            logger.warning('USSD menus have no %r step; every input goes to the assistant', ROOT_STEP)
+        self._screens = MappingProxyType({
+            language: MappingProxyType(paths) for language, paths in screens.items()
+        })
+        self._goodbye = MappingProxyType({
+            language: Screen('exit', labels['goodbye'], True, language) for language, labels in LABELS.items()
+        })
+
+    def _walk(self, screens, path, step, seen, max_depth):
+        menu = self._menus[step]
+        key = '*'.join(path)
+        for language in screens:
+            screens[language][key] = Screen(step, self._render(menu, language, root=not path), False, language)
+
+        if len(path) >= max_depth:
+            return
+        for number, option in enumerate(_field(menu, 'options') or [], 1):
+            next_step = _option(option)[1]
+            # Revisiting a screen already on this path would loop forever
+            if next_step in self._menus and next_step not in seen + (step,):
+                self._walk(screens, path + (str(number),), next_step, seen + (step,), max_depth)
+
+    def _labels(self, menu, language):
+        options = _field(menu, 'options') or []
+        translated = (_field(menu, 'options_swahili') or []) if language == 'sw' else options
+        labels = []
+        for index, option in enumerate(options):
+            label = _option(translated[index])[0] if index < len(translated) else ''
+            labels.append(label or _option(option)[0])
+        return labels
+
+    def _render(self, menu, language, root):
+        suffix = '_swahili' if language == 'sw' else ''
+        title = _field(menu, 'title' + suffix) or _field(menu, 'title') or ''
+        description = _field(menu, 'description' + suffix) or _field(menu, 'description') or ''
+        choices = [f'{number}. {label}' for number, label in enumerate(self._labels(menu, language), 1)]
+        if root and self.can_switch:
+            choices.append(f"{SWITCH_LANGUAGE}. {LABELS[language]['switch']}")
+        footer = f"0. {LABELS[language]['exit' if root else 'back']}"
+
+        def join(*parts):
+            return '\n\n'.join(part for part in parts if part)
+
+        text = join('\n'.join(part for part in (title, description) if part), '\n'.join(choices), footer)
+        if len(text) > self.screen_length:
+            # Choices matter more than the description on a small screen
+            text = join(title, '\n'.join(choices), footer)
+        if len(text) > self.screen_length:
+            logger.warning(
+                'USSD screen %r (%s) is %d characters, over the %d limit',
+                _field(menu, 'step'), language, len(text), self.screen_length
+            )
+            text = text[:self.screen_length - 3] + '...'
+        return text
+
+    def resolve(self, text, language='sw'):
+        """Screen for the cumulative USSD input text, or (None, free_text)
+
+        Inputs are separated by '*'. '0' goes back one screen (and exits
+        from the first), '00' returns to the first screen and '9' on the
+        first screen switches language. The screen's language is the one
+        the session is in after the input. Input that matches no screen is
+        a free text question.
+        """
+        if language not in self._screens:
+            language = 'sw'
+        path = []
+        tokens = [token.strip() for token in text.split('*')] if text else []
+        for token in tokens:
+            if token == BACK:
+                if not path:
+                    return self._goodbye[language], None
+                path.pop()
+            elif token == HOME:
+                path = []
+            elif token == SWITCH_LANGUAGE and not path and self.can_switch:
+                language = OTHER_LANGUAGE[language]
+            else:
+                path.append(token)
+        screen = self._screens[language].get('*'.join(path))
+        if screen is not None:
+            return screen, None
+        return None, tokens[-1] if tokens else ''
+
+    def __len__(self):
+        return len(self._screens['sw'])
+
+
+_menu = None
+_menu_version = None
+_menu_checked_at = 0.0
+_menu_lock = threading.Lock()
+
+
+def _shared_version():
+    return cache.get(VERSION_CACHE_KEY, 0)
+
+
+def compile_menus():
+    """Build a menu graph from the default screens with USSDMenu rows merged over them"""
+    options = _menu_settings()
+    rows = list(USSDMenu.objects.all())
+    overridden = {row.step for row in rows}
+    menus = [row for row in rows if row.is_active]
+    menus += [menu for menu in DEFAULT_MENUS if menu['step'] not in overridden]
+    return USSDMenuGraph(menus, screen_length=options['SCREEN_LENGTH'], max_depth=options['MAX_DEPTH'])
+
+
+def get_ussd_menu():
+    """Get the process-wide menu graph, compiling it on first use"""
+    global _menu, _menu_version, _menu_checked_at
+    menu = _menu
+    now = time.monotonic()
+    if menu is not None and now - _menu_checked_at < _menu_settings()['REFRESH_SECONDS']:
+        return menu
+
+    # Other workers bump the shared version when menus change, so the local
+    # graph is rebuilt at most once per refresh interval.
+    with _menu_lock:
+        version = _shared_version()
+        if _menu is None or version != _menu_version:
+            _menu = compile_menus()
+            _menu_version = version
+        _menu_checked_at = now
+        return _menu
+
+
+def reload_menus():
+    """Compile changed menus and swap them in; other workers follow on their next refresh"""
+    global _menu, _menu_version, _menu_checked_at
+    menu = compile_menus()
+    with _menu_lock:
+        try:
+            version = cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            version = 1
+            cache.set(VERSION_CACHE_KEY, version, None)
+        _menu = menu
+        _menu_version = version
+        _menu_checked_at = time.monotonic()
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from wanjiku_ai.caching import shared_cache
+from .models import USSDSession
+
+logger = logging.getLogger(__name__)
+
+
+class LiveUSSDSession:
+    """State of a USSD session in progress, kept outside the database"""
+
+    def __init__(self, session_id, phone_number, current_step='welcome', user_data=None,
+                 created_at=None, updated_at=None, expires_at=None):
+        self.session_id = session_id
+        self.phone_number = phone_number
+        self.current_step = current_step
+        self.user_data = user_data or {}
+        self.created_at = created_at or timezone.now()
+        self.updated_at = updated_at or self.created_at
+        self.expires_at = expires_at
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'phone_number': self.phone_number,
+            'current_step': self.current_step,
+            'user_data': self.user_data,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'expires_at': self.expires_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class USSDSessionStore:
+    """Base class for stores of live USSD sessions
+
+    Every hop reads and writes the store only. A session is written to
+    USSDSession once, when it completes, for auditing.
+    """
+
+    def __init__(self, timeout=300, max_entries=10000, **options):
+        self.timeout = timeout
+        self.max_entries = max_entries
+
+    def load(self, session_id, phone_number):
+        """Return the live session, starting a new one if there is none"""
+        data = self._get(session_id)
+        if data is None:
+            return LiveUSSDSession(session_id, phone_number)
+        return LiveUSSDSession.from_dict(data)
+
+    def save(self, session):
+        """Store the session and extend its expiry"""
+        session.updated_at = timezone.now()
+        session.expires_at = session.updated_at + timedelta(seconds=self.timeout)
+        self._set(session.session_id, session.to_dict())
+
+    def complete(self, session_id, status='completed', phone_number=None, session=None):
+        """End a session and write its audit record; returns the USSDSession or None
+
+        session is the live session as it ends, e.g. on a final screen;
+        by default the stored one is used.
+        """
+        data = self._pop(session_id)
+        if session is not None:
+            data = session.to_dict()
+        if data is None:
+            record = USSDSession.objects.filter(session_id=session_id).first()
+            if record is not None:
+                # Already ended on a final screen; keep its last step and data
+                if record.status != status:
+                    record.status = status
+                    record.save(update_fields=['status'])
+                return record
+            if phone_number is None:
+                return None
+            # Expired before the gateway reported the end; record what we know
+            data = LiveUSSDSession(session_id, phone_number).to_dict()
+        session = LiveUSSDSession.from_dict(data)
+        record, created = USSDSession.objects.update_or_create(
+            session_id=session.session_id,
+            defaults={
+                'phone_number': session.phone_number,
+                'status': status,
+                'current_step': session.current_step,
+                'user_data': session.user_data,
+                'expires_at': session.expires_at or timezone.now(),
+            }
+        )
+        if created:
+            # auto_now_add stamps the completion time; keep when the session began
+            USSDSession.objects.filter(pk=record.pk).update(created_at=session.created_at)
+            record.created_at = session.created_at
+        return record
+
+    def _get(self, session_id):
+        raise NotImplementedError
+
+    def _set(self, session_id, data):
+        raise NotImplementedError
+
+    def _pop(self, session_id):
+        raise NotImplementedError
+
+
+class MemoryUSSDSessionStore(USSDSessionStore):
+    """In-process session store; only for a single worker process"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[session_id]
+                return None
+            return data
+
+    def _set(self, session_id, data):
+        with self._lock:
+            self._entries[session_id] = (data, time.monotonic() + self.timeout)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _pop(self, session_id):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+
+class DjangoUSSDSessionStore(USSDSessionStore):
+    """Session store in a Django cache alias, e.g. Redis, expiring with native TTLs"""
+
+    def __init__(self, alias='default', key_prefix='sms:ussd', **options):
+        super().__init__(**options)
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _cache_key(self, session_id):
+        return f'{self.key_prefix}:{session_id}'
+
+    def _get(self, session_id):
+        return self.cache.get(self._cache_key(session_id))
+
+    def _set(self, session_id, data):
+        self.cache.set(self._cache_key(session_id), data, self.timeout)
+
+    def _pop(self, session_id):
+        key = self._cache_key(session_id)
+        data = self.cache.get(key)
+        if data is not None:
+            self.cache.delete(key)
+        return data
+
+
+BACKENDS = {
+    'memory': 'sms.ussd_store.MemoryUSSDSessionStore',
+    'django': 'sms.ussd_store.DjangoUSSDSessionStore',
+}
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Get the process-wide USSD session store configured in settings"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                options = dict(getattr(settings, 'USSD_SESSION_STORE', {}))
+                backend = options.pop('BACKEND', 'django')
+                store_class = import_string(BACKENDS.get(backend, backend))
+                _session_store = store_class(**{key.lower(): value for key, value in options.items()})
+                _check_shared(_session_store)
+    return _session_store
+
+
+def _check_shared(store):
+    # A USSD session's hops can reach different workers, which then lose its state
+    if isinstance(store, MemoryUSSDSessionStore):
+        logger.warning('USSD sessions are kept per process; use the django backend with several workers')
+    elif isinstance(store, DjangoUSSDSessionStore) and not shared_cache(store.alias):
+        logger.warning(
+            'USSD sessions are kept in the %r cache, which is not shared between processes; '
+            'configure a shared cache such as Redis with several workers', store.alias
+        )
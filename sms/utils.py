@@ -0,0 +1,17 @@
+import re
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone_number(phone_number, country_code='254'):
+    """Return a Kenyan mobile number in E.164 form (+2547XXXXXXXX), or None if invalid"""
+    digits = _NON_DIGITS.sub('', phone_number or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith(country_code):
+        digits = digits[len(country_code):]
+    elif digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) != 9 or digits[0] not in '17':
+        return None
+    return f'+{country_code}{digits}'
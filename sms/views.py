@@ -2,11 +2,22 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.parsers import JSONParser, MultiPartParser
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
-from .models import SMSMessage, USSDSession, USSDMenu
+from django.utils.dateparse import parse_datetime
+from .models import SMSMessage, USSDSession, USSDMenu, BroadcastCampaign
 from .services import SMSService, USSDService
-from .serializers import SMSMessageSerializer, USSDSessionSerializer, USSDMenuSerializer
+from .delivery import record_delivery_report
+from .idempotency import webhook_dedup, webhook_key
+from .broadcasts import (
+    add_recipients, campaign_stats, contact_phone_numbers, pause_campaign,
+    read_phone_numbers, start_campaign
+)
+from .serializers import SMSMessageSerializer, USSDSessionSerializer, USSDMenuSerializer, BroadcastCampaignSerializer
 
 
 class SMSMessageViewSet(viewsets.ReadOnlyModelViewSet):
@@ -51,6 +62,20 @@ class SMSMessageViewSet(viewsets.ReadOnlyModelViewSet):
         result = sms_service.process_incoming_sms(phone_number, message)
         
         return Response(result)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def segments(self, request):
+        """Segments sent and saved by reply compaction"""
+        totals = SMSMessage.objects.filter(message_type='outgoing').aggregate(
+            messages=Count('id'),
+            segments=Sum('segments'),
+            original_segments=Sum(Coalesce('original_segments', 'segments')),
+            ucs2_messages=Count('id', filter=Q(encoding='ucs2'))
+        )
+        totals['segments'] = totals['segments'] or 0
+        totals['original_segments'] = totals['original_segments'] or 0
+        totals['segments_saved'] = totals['original_segments'] - totals['segments']
+        return Response(totals)
 
 
 class USSDSessionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -101,6 +126,66 @@ class USSDMenuViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 
+class BroadcastCampaignViewSet(viewsets.ModelViewSet):
+    """ViewSet for bulk SMS broadcast campaigns"""
+    queryset = BroadcastCampaign.objects.all()
+    serializer_class = BroadcastCampaignSerializer
+    permission_classes = [IsAdminUser]
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+    
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser])
+    def upload_recipients(self, request, pk=None):
+        """Add recipients from a CSV file of phone numbers"""
+        campaign = self.get_object()
+        recipients_file = request.FILES.get('file')
+        
+        if not recipients_file:
+            return Response({'error': 'CSV file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if campaign.status == 'completed':
+            return Response({'error': 'Campaign is already completed'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        added, invalid = add_recipients(campaign, read_phone_numbers(recipients_file))
+        return Response({'added': added, 'invalid': invalid, 'total_recipients': campaign.total_recipients})
+    
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser])
+    def select_recipients(self, request, pk=None):
+        """Add everyone who has texted us, optionally only since a date"""
+        campaign = self.get_object()
+        since = request.data.get('since')
+        
+        if campaign.status == 'completed':
+            return Response({'error': 'Campaign is already completed'}, status=status.HTTP_400_BAD_REQUEST)
+        since = parse_datetime(since) if since else None
+        
+        added, invalid = add_recipients(campaign, contact_phone_numbers(since))
+        return Response({'added': added, 'invalid': invalid, 'total_recipients': campaign.total_recipients})
+    
+    @action(detail=True, methods=['post'])
+    def start(self, request, pk=None):
+        """Start or resume sending"""
+        campaign = self.get_object()
+        if not campaign.total_recipients:
+            return Response({'error': 'Campaign has no recipients'}, status=status.HTTP_400_BAD_REQUEST)
+        if not start_campaign(campaign):
+            return Response({'error': f'Cannot start a {campaign.status} campaign'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(campaign_stats(campaign))
+    
+    @action(detail=True, methods=['post'])
+    def pause(self, request, pk=None):
+        """Pause sending"""
+        campaign = self.get_object()
+        if not pause_campaign(campaign):
+            return Response({'error': 'Campaign is not running'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(campaign_stats(campaign))
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Live progress and throughput"""
+        return Response(campaign_stats(self.get_object()))
+
+
 class SMSWebhookView(APIView):
     """Webhook for incoming SMS from Africa's Talking"""
     authentication_classes = []
@@ -119,20 +204,44 @@ class SMSWebhookView(APIView):
                     'message': 'Missing phone number or message'
                 }, status=400)
             
-            sms_service = SMSService()
-            result = sms_service.process_incoming_sms(phone_number, message)
-            
-            return JsonResponse({
-                'status': 'success',
-                'message': 'SMS processed',
-                'data': result
-            })
+            # Gateway retries carry the same message id; without one, the
+            # send date tells a retry from a new message with the same text
+            key = None
+            if data.get('id') or data.get('date'):
+                key = webhook_key('sms', data.get('id', ''), {
+                    'from': phone_number, 'to': data.get('to', ''),
+                    'text': message, 'date': data.get('date', '')
+                })
+            body, status_code = webhook_dedup.handle(
+                'sms', key, lambda: self._process(phone_number, message),
+                pending_response=({'status': 'success', 'message': 'SMS already received'}, 200)
+            )
+            return JsonResponse(body, status=status_code)
             
         except Exception as e:
             return JsonResponse({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
+    
+    def _process(self, phone_number, message):
+        sms_service = SMSService()
+        if settings.SMS_ASYNC_PROCESSING:
+            # Reply from a worker so slow LLM turns never time out the gateway
+            sms_message = sms_service.receive_sms(phone_number, message)
+            return {
+                'status': 'success',
+                'message': 'SMS queued',
+                'data': {'message_id': sms_message.id}
+            }, 200
+        
+        result = sms_service.process_incoming_sms(phone_number, message)
+        
+        return {
+            'status': 'success',
+            'message': 'SMS processed',
+            'data': result
+        }, 200
 
 
 class USSDWebhookView(APIView):
@@ -154,8 +263,15 @@ class USSDWebhookView(APIView):
                     'sessionId': session_id or ''
                 })
             
-            ussd_service = USSDService()
-            result = ussd_service.process_ussd_request(session_id, phone_number, text)
+            # Each step of a session is identified by the text typed so far
+            key = webhook_key('ussd', session_id, {
+                'phoneNumber': phone_number, 'serviceCode': data.get('serviceCode', ''), 'text': text
+            })
+            result = webhook_dedup.handle(
+                'ussd', key, lambda: USSDService().process_ussd_request(session_id, phone_number, text),
+                pending_response={'response': 'Samahani, ombi lako bado linashughulikiwa. Tafadhali jaribu tena.'},
+                cacheable=lambda result: result.get('success', False)
+            )
             
             return JsonResponse({
                 'response': result.get('response', 'Samahani, kuna tatizo.'),
@@ -167,3 +283,58 @@ class USSDWebhookView(APIView):
                 'response': 'Samahani, kuna tatizo. Tafadhali jaribu tena.',
                 'sessionId': request.POST.get('sessionId', '')
             })
+
+
+class USSDSessionEndWebhookView(APIView):
+    """Webhook for Africa's Talking end-of-session notifications"""
+    authentication_classes = []
+    permission_classes = []
+    
+    def post(self, request):
+        """Write the finished session to the database"""
+        data = request.POST
+        session_id = data.get('sessionId')
+        
+        if not session_id:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Missing session id'
+            }, status=400)
+        
+        # Incomplete and Failed sessions were abandoned or timed out
+        session_status = 'completed' if data.get('status') == 'Success' else 'expired'
+        result = USSDService().end_session(session_id, status=session_status, phone_number=data.get('phoneNumber'))
+        
+        return JsonResponse({
+            'status': 'success' if result['success'] else 'error',
+            'message': result.get('message', result.get('error'))
+        })
+
+
+class DeliveryReportWebhookView(APIView):
+    """Webhook for SMS delivery reports from Africa's Talking"""
+    authentication_classes = []
+    permission_classes = []
+    
+    def post(self, request):
+        """Save a delivery report; it is applied with the next bulk update"""
+        data = request.POST
+        message_id = data.get('id')
+        report_status = data.get('status')
+        
+        if not message_id or not report_status:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Missing message id or status'
+            }, status=400)
+        
+        if not record_delivery_report(message_id, report_status):
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Delivery report ignored'
+            })
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Delivery report queued'
+        })
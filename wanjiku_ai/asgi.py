@@ -1,5 +1,8 @@
 """
 ASGI config for wanjiku_ai project.
+
+Serve with an ASGI server (e.g. `uvicorn wanjiku_ai.asgi:application`) so
+streaming chat replies are flushed to clients token by token.
 """
 
 import os
@@ -0,0 +1,158 @@
+"""
+Versioned response caching with ETag and Last-Modified for reference data.
+
+Every watched model has a version in the cache that post_save/post_delete
+signals bump. Cached responses are keyed on those versions, so a change
+makes old entries unreachable instead of requiring explicit deletes.
+
+Versions only reach other workers through a shared cache. With a
+per-process cache (LocMem, the default without CACHE_URL) pages and
+versions are kept for API_CACHE_LOCAL_TIMEOUT seconds only, which bounds
+how long another worker can serve a stale page.
+"""
+
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache(alias='default'):
+    """True when a cache alias is shared between worker processes"""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def _timeouts():
+    # (page timeout, version timeout)
+    if shared_cache():
+        return getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60), None
+    local_timeout = getattr(settings, 'API_CACHE_LOCAL_TIMEOUT', 5)
+    return local_timeout, local_timeout
+
+
+def _version_key(model):
+    return f'api:version:{model._meta.label_lower}'
+
+
+def model_version(model):
+    """Return {'version', 'modified'} for a watched model"""
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so versions never repeat after a cache flush
+        now = time.time()
+        cache.add(key, {'version': int(now * 1000), 'modified': int(now)}, _timeouts()[1])
+        version = cache.get(key) or {'version': int(now * 1000), 'modified': int(now)}
+    return version
+
+
+def bump_model_version(model):
+    """Invalidate every cached response built from model"""
+    now = time.time()
+    current = cache.get(_version_key(model)) or {'version': 0}
+    cache.set(
+        _version_key(model),
+        {'version': max(current['version'] + 1, int(now * 1000)), 'modified': int(now)},
+        _timeouts()[1]
+    )
+
+
+def _bump_on_change(sender, using=None, **kwargs):
+    # After commit, so a reader cannot cache the old rows under the new
+    # version, and a rolled back write invalidates nothing
+    transaction.on_commit(lambda: bump_model_version(sender), using=using)
+
+
+def watch_models(*models):
+    """Bump the cache version of models whenever one of their rows changes"""
+    for model in models:
+        uid = f'api-version-{model._meta.label_lower}'
+        post_save.connect(_bump_on_change, sender=model, dispatch_uid=uid)
+        post_delete.connect(_bump_on_change, sender=model, dispatch_uid=uid)
+
+
+class CachedReadOnlyMixin:
+    """Serve list/retrieve (and `cached_actions`) from a version-keyed cache
+
+    Responses carry a strong ETag and Last-Modified, and conditional GETs
+    that still match are answered with 304 without querying the database.
+    """
+    cache_models = None
+    cached_actions = ('list', 'retrieve')
+    _cache_versions = None
+
+    def get_cache_models(self):
+        return self.cache_models or [self.queryset.model]
+
+    def _versions(self):
+        return [model_version(model) for model in self.get_cache_models()]
+
+    def _cache_key(self, request, versions):
+        version_tag = '.'.join(str(version['version']) for version in versions)
+        path = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+        return f'api:response:{self.__class__.__module__}.{self.__class__.__name__}:{version_tag}:{path}'
+
+    def _not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method != 'GET' or self.action not in self.cached_actions:
+            return
+
+        versions = self._versions()
+        entry = cache.get(self._cache_key(request, versions))
+        self._cache_versions = versions
+        if entry is not None:
+            # dispatch() looks the handler up after initial(), so a cached
+            # page replaces it and the queryset is never evaluated
+            self._cached_entry = entry
+            setattr(self, request.method.lower(), self._serve_cached)
+
+    def _serve_cached(self, request, *args, **kwargs):
+        return self._cached_response(request, self._cached_entry)
+
+    def _cached_response(self, request, entry):
+        last_modified = max(version['modified'] for version in self._cache_versions)
+        if self._not_modified(request, entry['etag'], last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        versions = getattr(self, '_cache_versions', None)
+        if (versions is not None and response.status_code == status.HTTP_200_OK
+                and isinstance(response, Response) and 'ETag' not in response):
+            # Freshly rendered page: store it and answer like a cached hit
+            body = json.dumps(response.data, sort_keys=True, default=str)
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(hashlib.sha256(body.encode('utf-8')).hexdigest()),
+            }
+            cache.set(
+                self._cache_key(request, versions),
+                entry,
+                _timeouts()[0]
+            )
+            response = self._cached_response(request, entry)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,26 @@
+"""
+Celery app for wanjiku_ai.
+
+Start a worker for the SMS queue and one beat process for the periodic
+tasks in CELERY_BEAT_SCHEDULE with
+    celery -A wanjiku_ai worker -Q sms
+    celery -A wanjiku_ai beat
+"""
+
+import os
+
+from celery import Celery
+from celery.signals import worker_process_shutdown
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wanjiku_ai.settings')
+
+app = Celery('wanjiku_ai')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_process_shutdown.connect
+def flush_write_behind_buffers(**kwargs):
+    """Save buffered chat messages before a worker process exits"""
+    from chat.persistence import message_buffer
+    message_buffer.flush()
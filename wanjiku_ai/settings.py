@@ -171,6 +171,34 @@ REST_FRAMEWORK = {
     },
 }
 
+# Service search backend: '' picks one for the database vendor
+# ('sqlite' FTS5, 'postgresql' tsvector + GIN, anything else basic matching)
+SERVICE_SEARCH_BACKEND = config('SERVICE_SEARCH_BACKEND', default='')
+
+# Cache Configuration
+# Set CACHE_URL (e.g. redis://localhost:6379/1) to share caches between workers
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Lifetime of cached reference-data API pages; changes invalidate them earlier
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# Without CACHE_URL each worker has its own cache and never sees another's
+# invalidations, so pages are only kept this long
+API_CACHE_LOCAL_TIMEOUT = config('API_CACHE_LOCAL_TIMEOUT', default=5, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -178,14 +206,166 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# SMS work runs on its own queue; a worker holds at most one unacknowledged
+# task per process and redelivers tasks lost with a crashed worker
+CELERY_TASK_ROUTES = {'sms.tasks.*': {'queue': 'sms'}}
+CELERY_WORKER_CONCURRENCY = config('CELERY_WORKER_CONCURRENCY', default=4, cast=int)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# Run tasks in the calling process, e.g. for the in-process benchmark
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_BEAT_SCHEDULE = {
+    'requeue-stale-sms': {
+        'task': 'sms.tasks.requeue_stale_sms',
+        'schedule': 300.0,
+    },
+}
+
+# Outgoing SMS batching: recipients per provider call, calls per second
+# (shared between processes through the cache) and messages claimed per
+# dispatch round
+SMS_DISPATCH = {
+    'BATCH_SIZE': config('SMS_DISPATCH_BATCH_SIZE', default=100, cast=int),
+    'RATE_LIMIT': config('SMS_DISPATCH_RATE_LIMIT', default=5.0, cast=float),
+    'MAX_MESSAGES': config('SMS_DISPATCH_MAX_MESSAGES', default=500, cast=int),
+}
+
+# Broadcast campaigns are read and sent CHUNK_SIZE recipients per task
+SMS_BROADCAST = {
+    'CHUNK_SIZE': config('SMS_BROADCAST_CHUNK_SIZE', default=1000, cast=int),
+}
+
+# Delivery reports are saved as they arrive and applied by a Celery task in
+# batches of MAX_BATCH, at most every FLUSH_INTERVAL seconds
+SMS_DELIVERY_REPORTS = {
+    'MAX_BATCH': config('SMS_DELIVERY_REPORTS_MAX_BATCH', default=500, cast=int),
+    'FLUSH_INTERVAL': config('SMS_DELIVERY_REPORTS_FLUSH_INTERVAL', default=2.0, cast=float),
+}
+
+# SMS from one number share a chat session until it is idle this long
+SMS_SESSIONS = {
+    'INACTIVITY_TIMEOUT': config('SMS_SESSION_INACTIVITY_TIMEOUT', default=30 * 60, cast=int),
+}
+
+# Outgoing replies are transliterated to GSM-7 and fitted into MAX_SEGMENTS
+SMS_ENCODING = {
+    'ENABLED': config('SMS_COMPACTION_ENABLED', default=True, cast=bool),
+    'MAX_SEGMENTS': config('SMS_MAX_SEGMENTS', default=3, cast=int),
+    'ABBREVIATE': config('SMS_ABBREVIATE', default=True, cast=bool),
+}
+
+# Live USSD session state ('django' cache alias or per-process 'memory');
+# sessions are written to the database when they end
+USSD_SESSION_STORE = {
+    'BACKEND': config('USSD_SESSION_STORE_BACKEND', default='django'),
+    'TIMEOUT': config('USSD_SESSION_TIMEOUT', default=5 * 60, cast=int),
+}
+
+# USSD screens are compiled from USSDMenu rows; other workers pick up
+# changes within REFRESH_SECONDS
+USSD_MENUS = {
+    'SCREEN_LENGTH': config('USSD_SCREEN_LENGTH', default=160, cast=int),
+    'REFRESH_SECONDS': config('USSD_MENUS_REFRESH_SECONDS', default=30, cast=int),
+}
+
+# Gateway retries of SMS and USSD callbacks get the stored response for
+# WINDOWS seconds instead of being processed again
+SMS_IDEMPOTENCY = {
+    'ENABLED': config('SMS_IDEMPOTENCY_ENABLED', default=True, cast=bool),
+    'SHARED': config('SMS_IDEMPOTENCY_SHARED', default=True, cast=bool),
+    'MAX_ENTRIES': config('SMS_IDEMPOTENCY_MAX_ENTRIES', default=10000, cast=int),
+    'WINDOWS': {
+        'sms': config('SMS_IDEMPOTENCY_SMS_WINDOW', default=60 * 60, cast=int),
+        'ussd': config('SMS_IDEMPOTENCY_USSD_WINDOW', default=3 * 60, cast=int),
+    },
+}
+
+# Acknowledge SMS webhooks at once and answer from a Celery worker
+SMS_ASYNC_PROCESSING = config('SMS_ASYNC_PROCESSING', default=True, cast=bool)
 
 # Africa's Talking Configuration
 AFRICASTALKING_USERNAME = config('AFRICASTALKING_USERNAME', default='')
 AFRICASTALKING_API_KEY = config('AFRICASTALKING_API_KEY', default='')
+# Overrides the API host, e.g. http://127.0.0.1:8900 for loadtest/standin.py
+AFRICASTALKING_API_BASE_URL = config('AFRICASTALKING_API_BASE_URL', default='')
 
 # OpenAI Configuration
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 
+# Shared OpenAI client: connection pool, timeouts (seconds) and the maximum
+# number of concurrent LLM calls per worker process
+LLM_CLIENT = {
+    'BASE_URL': config('OPENAI_BASE_URL', default=''),
+    'TIMEOUT': config('LLM_TIMEOUT', default=20.0, cast=float),
+    'CONNECT_TIMEOUT': config('LLM_CONNECT_TIMEOUT', default=5.0, cast=float),
+    'MAX_RETRIES': config('LLM_MAX_RETRIES', default=1, cast=int),
+    'MAX_CONNECTIONS': config('LLM_MAX_CONNECTIONS', default=20, cast=int),
+    'MAX_KEEPALIVE_CONNECTIONS': config('LLM_MAX_KEEPALIVE_CONNECTIONS', default=10, cast=int),
+    'KEEPALIVE_EXPIRY': config('LLM_KEEPALIVE_EXPIRY', default=60.0, cast=float),
+    'MAX_CONCURRENCY': config('LLM_MAX_CONCURRENCY', default=16, cast=int),
+    'ACQUIRE_TIMEOUT': config('LLM_ACQUIRE_TIMEOUT', default=5.0, cast=float),
+}
+
+# Chat Configuration
+# How often each worker checks whether another worker changed the intents
+INTENT_MATCHER_REFRESH_SECONDS = config('INTENT_MATCHER_REFRESH_SECONDS', default=30, cast=int)
+
+# Write-behind batching of ChatMessage rows; disable for synchronous saves (tests)
+CHAT_WRITE_BEHIND = {
+    'ENABLED': config('CHAT_WRITE_BEHIND_ENABLED', default=True, cast=bool),
+    'MAX_BATCH': config('CHAT_WRITE_BEHIND_MAX_BATCH', default=200, cast=int),
+    'FLUSH_INTERVAL': config('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', default=1.0, cast=float),
+}
+
+# Conversation context sent to the LLM: token budget for recent turns and how
+# many overflowing turns are folded into the rolling summary at once
+CHAT_CONTEXT = {
+    'TOKEN_BUDGET': config('CHAT_CONTEXT_TOKEN_BUDGET', default=1200, cast=int),
+    'MAX_HISTORY': config('CHAT_CONTEXT_MAX_HISTORY', default=20, cast=int),
+    'SUMMARY_BATCH': config('CHAT_CONTEXT_SUMMARY_BATCH', default=6, cast=int),
+    'SUMMARY_MAX_TOKENS': config('CHAT_CONTEXT_SUMMARY_MAX_TOKENS', default=150, cast=int),
+}
+
+# Local BM25 index over FAQs, services and intent templates answering questions
+# before the LLM; THRESHOLD is a 0..1 score relative to the shortest document
+# containing every query term once
+FAQ_RETRIEVAL = {
+    'ENABLED': config('FAQ_RETRIEVAL_ENABLED', default=True, cast=bool),
+    'THRESHOLD': config('FAQ_RETRIEVAL_THRESHOLD', default=0.6, cast=float),
+    'REFRESH_SECONDS': config('FAQ_RETRIEVAL_REFRESH_SECONDS', default=30, cast=int),
+}
+
+# Per-channel reply deadlines (seconds) and the circuit breaker around
+# OpenAI; while it is open, replies come from curated FAQs and intents
+LLM_RESILIENCE = {
+    'DEADLINES': {
+        'web': config('LLM_DEADLINE_WEB', default=15.0, cast=float),
+        'sms': config('LLM_DEADLINE_SMS', default=8.0, cast=float),
+        'ussd': config('LLM_DEADLINE_USSD', default=2.5, cast=float),
+    },
+    'FAILURE_THRESHOLD': config('LLM_BREAKER_FAILURE_THRESHOLD', default=5, cast=int),
+    'SLOW_CALL_SECONDS': config('LLM_BREAKER_SLOW_CALL_SECONDS', default=8.0, cast=float),
+    'OPEN_SECONDS': config('LLM_BREAKER_OPEN_SECONDS', default=30.0, cast=float),
+}
+
+# Coalescing of identical concurrent LLM requests; SHARED also coordinates
+# workers through the cache (needs CACHE_URL)
+LLM_SINGLE_FLIGHT = {
+    'ENABLED': config('LLM_SINGLE_FLIGHT_ENABLED', default=True, cast=bool),
+    'SHARED': config('LLM_SINGLE_FLIGHT_SHARED', default=False, cast=bool),
+    'WAIT_TIMEOUT': config('LLM_SINGLE_FLIGHT_WAIT_TIMEOUT', default=30.0, cast=float),
+}
+
+# Cache of OpenAI answers to unmatched questions ('django' or 'memory').
+# 'memory' is per process, so clearing it only reaches the clearing process.
+LLM_RESPONSE_CACHE = {
+    'ENABLED': config('LLM_RESPONSE_CACHE_ENABLED', default=True, cast=bool),
+    'BACKEND': config('LLM_RESPONSE_CACHE_BACKEND', default='django'),
+    'TTL': config('LLM_RESPONSE_CACHE_TTL', default=6 * 60 * 60, cast=int),
+    'MAX_ENTRIES': config('LLM_RESPONSE_CACHE_MAX_ENTRIES', default=2000, cast=int),
+}
+
 # Blockchain Configuration
 ETHEREUM_RPC_URL = config('ETHEREUM_RPC_URL', default='https://mainnet.infura.io/v3/YOUR_PROJECT_ID')
 PRIVATE_KEY = config('PRIVATE_KEY', default='')